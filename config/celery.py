@@ -1,6 +1,7 @@
 import os
 
 from celery import Celery
+from celery.signals import worker_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
@@ -9,3 +10,19 @@ app = Celery("config")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def configure_db_connections(**kwargs):
+    """
+    Срок жизни соединений с базой в воркерах celery.
+
+    Celery закрывает соединения после задачи только когда они устарели
+    по CONN_MAX_AGE, поэтому настройка из WORKER_DB_CONN_MAX_AGE задает
+    переиспользование соединений между задачами. Меняется до форка
+    дочерних процессов и до первых запросов к базе.
+    """
+    from django.conf import settings
+
+    for database in settings.DATABASES.values():
+        database["CONN_MAX_AGE"] = settings.WORKER_DB_CONN_MAX_AGE
@@ -0,0 +1,43 @@
+"""
+Настройки gunicorn для продакшен-запуска.
+
+WSGI: gunicorn -c config/gunicorn.conf.py config.wsgi
+ASGI: GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker \
+      gunicorn -c config/gunicorn.conf.py config.asgi
+
+Плавный перезапуск воркеров без потери запросов и с новым кодом:
+kill -HUP <pid мастера>. С GUNICORN_PRELOAD=True новый код подхватывается
+только полным перезапуском.
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Воркеры-процессы обходят GIL, потоки внутри воркера закрывают ожидание
+# базы и редиса.
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Периодический перезапуск воркеров страхует от утечек памяти;
+# разброс не дает всем воркерам перезапуститься одновременно.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+# По умолчанию каждый воркер загружает приложение сам, поэтому HUP
+# разворачивает новый код. Загрузка до fork экономит память и ускоряет
+# старт, но тогда HUP перезапускает воркеры со старым кодом мастера.
+# Соединения с базой и редисом в любом случае открываются в воркерах.
+preload_app = os.getenv("GUNICORN_PRELOAD") == "True"
+
+# Пустое значение отключает журнал запросов.
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+forwarded_allow_ips = "*"
@@ -0,0 +1,77 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY_PIN_PREFIX = "db:primary_pin"
+
+replica_reads = ContextVar("replica_reads", default=None)
+
+
+def choose_replica():
+    """
+    Реплика для всех чтений одного запроса или None, если реплик нет.
+    """
+    if settings.DATABASE_REPLICAS:
+        return random.choice(settings.DATABASE_REPLICAS)
+    return None
+
+
+@contextmanager
+def primary_reads():
+    """
+    Чтение с основной базы внутри блока, даже если включены реплики.
+    """
+    token = replica_reads.set(None)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+def get_primary_pin_key(user_id):
+    return f"{PRIMARY_PIN_PREFIX}:{user_id}"
+
+
+def pin_to_primary(user_id):
+    """
+    Чтение пользователя с основной базы в течение READ_YOUR_WRITES_WINDOW.
+
+    Вызывается после изменений, чтобы реплика с отставанием не вернула
+    пользователю данные без его же правок.
+    """
+    if user_id is not None and settings.READ_YOUR_WRITES_WINDOW:
+        cache.set(get_primary_pin_key(user_id), True, settings.READ_YOUR_WRITES_WINDOW)
+
+
+def is_pinned_to_primary(user_id):
+    return user_id is not None and cache.get(get_primary_pin_key(user_id), False)
+
+
+class ReplicaRouter:
+    """
+    Маршрутизация чтений на реплики из DATABASE_REPLICAS.
+
+    На реплику уходят только чтения внутри контекста replica_reads,
+    в котором представления только для чтения выбирают одну реплику
+    на весь запрос: валидаторы и страница читаются с одинаковым
+    отставанием. Остальные чтения, все записи и миграции идут
+    в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        return replica_reads.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
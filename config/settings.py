@@ -66,7 +66,7 @@ DEFAULT_CHARSET = "utf-8"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.UserJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -83,9 +83,31 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
         "HOST": os.getenv("POSTGRES_HOST", "db"),
         "PORT": os.getenv("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "True") == "True",
     }
 }
 
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(","))):
+    alias = f"replica_{number}"
+    host, _, port = host.strip().partition(":")
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["config.routers.ReplicaRouter"]
+
+READ_YOUR_WRITES_WINDOW = int(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+
+WORKER_DB_CONN_MAX_AGE = int(
+    os.getenv("WORKER_DB_CONN_MAX_AGE", DATABASES["default"]["CONN_MAX_AGE"])
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -118,18 +140,60 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.UserTokenObtainPairSerializer",
+    "TOKEN_USER_CLASS": "users.authentication.TokenUser",
 }
 
+JWT_STATELESS_AUTH = os.getenv("JWT_STATELESS_AUTH") == "True"
+TOKEN_USER_CACHE_TIMEOUT = int(os.getenv("TOKEN_USER_CACHE_TIMEOUT", "60"))
+
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_REQUEST_TIMEOUT = float(os.getenv("TELEGRAM_REQUEST_TIMEOUT", "10"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+TELEGRAM_RETRY_BACKOFF = float(os.getenv("TELEGRAM_RETRY_BACKOFF", "0.5"))
+TELEGRAM_RATE_LIMIT = float(os.getenv("TELEGRAM_RATE_LIMIT", "30"))
+TELEGRAM_RATE_LIMIT_KEY = os.getenv("TELEGRAM_RATE_LIMIT_KEY", "habits:telegram_rate")
+TELEGRAM_DISPATCH_CHUNK_SIZE = int(os.getenv("TELEGRAM_DISPATCH_CHUNK_SIZE", "500"))
+TELEGRAM_DISPATCH_WORKERS = int(os.getenv("TELEGRAM_DISPATCH_WORKERS", "16"))
+TELEGRAM_DISPATCH_BATCH_SIZE = int(os.getenv("TELEGRAM_DISPATCH_BATCH_SIZE", "1000"))
+TELEGRAM_DIGEST_WINDOW = int(os.getenv("TELEGRAM_DIGEST_WINDOW", "300"))
 
-CELERY_BEAT_SCHEDULE = {
-    "check_habits_to_notify_every_minute": {
+REDIS_URL = os.getenv("REDIS_URL")
+
+CACHE_URL = os.getenv("CACHE_URL", f"{REDIS_URL}/1" if REDIS_URL else "locmem://")
+
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "habittracker"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+CACHE_LOCK_TIMEOUT = int(os.getenv("CACHE_LOCK_TIMEOUT", "5"))
+
+PUBLIC_FEED_CACHE_TIMEOUT = int(os.getenv("PUBLIC_FEED_CACHE_TIMEOUT", "300"))
+
+REMINDER_SCHEDULER_ENABLED = os.getenv("REMINDER_SCHEDULER_ENABLED") == "True"
+REMINDER_SCHEDULER_CHANNEL = os.getenv("REMINDER_SCHEDULER_CHANNEL", "habits:reminders")
+REMINDER_SCHEDULER_HORIZON = int(os.getenv("REMINDER_SCHEDULER_HORIZON", "3600"))
+REMINDER_SCHEDULER_RETRY_DELAY = int(os.getenv("REMINDER_SCHEDULER_RETRY_DELAY", "60"))
+
+CELERY_BEAT_SCHEDULE = {}
+
+if not REMINDER_SCHEDULER_ENABLED:
+    CELERY_BEAT_SCHEDULE["check_habits_to_notify_every_minute"] = {
         "task": "habits.tasks.check_and_send_tg_notifications",
         "schedule": timedelta(seconds=60),
-    },
-}
-
-REDIS_URL = os.getenv("REDIS_URL")
+    }
 
 CELERY_BROKER_URL = f"{REDIS_URL}/0"
 CELERY_RESULT_BACKEND = f"{REDIS_URL}/0"
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from habits.models import Habit
+from habits.models import Habit, HabitTombstone
 
 
 @admin.register(Habit)
@@ -15,3 +15,12 @@ class HabitAdmin(admin.ModelAdmin):
         "place",
         "reward",
     )
+
+
+@admin.register(HabitTombstone)
+class HabitTombstoneAdmin(admin.ModelAdmin):
+    """
+    Регистрация отметок об удалении привычек в админке
+    """
+
+    list_display = ("id", "habit_id", "owner", "deleted_at")
@@ -0,0 +1,199 @@
+import base64
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (APIException, NotAuthenticated,
+                                       NotFound, ParseError)
+
+from config.routers import pin_to_primary
+from habits.models import Habit
+from habits.paginators import HabitPaginator
+from habits.serializers import HabitRowSerializer, HabitSerializer
+from habits.sync import create_tombstones, touch_dependents
+from users.authentication import UserJWTAuthentication
+from users.models import User
+
+
+def encode_cursor(row):
+    """
+    Курсор следующей страницы по позиции (created_at, id) последней строки.
+    """
+    payload = [row["created_at"].isoformat(), row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Разбор курсора в позицию (created_at, id).
+    """
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError
+        return created_at, int(pk)
+    except (ValueError, TypeError):
+        raise NotFound("Некорректный курсор.")
+
+
+class AsyncHabitView(View):
+    """
+    Базовое асинхронное представление привычек.
+
+    JWT проверяется тем же классом аутентификации, что и в DRF, исключения
+    DRF превращаются в JSON-ответы с их статусом. Чтения идут через
+    асинхронный ORM, а запись с валидацией HabitSerializer, сигналами
+    и транзакцией выполняется в потоке через sync_to_async.
+    """
+
+    authentication = UserJWTAuthentication()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user = await self.authenticate(request)
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return JsonResponse(
+                (
+                    exc.detail
+                    if isinstance(exc.detail, (dict, list))
+                    else {"detail": exc.detail}
+                ),
+                status=exc.status_code,
+                safe=False,
+            )
+
+    async def authenticate(self, request):
+        """
+        Пользователь из JWT; в режиме JWT_STATELESS_AUTH без запроса к базе.
+        """
+        result = await sync_to_async(self.authentication.authenticate)(request)
+        if result is None:
+            raise NotAuthenticated()
+        return result[0]
+
+    def get_queryset(self):
+        """
+        Привычки пользователя; суперюзеру доступны все.
+        """
+        queryset = Habit.objects.all()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(owner_id=self.request.user.pk)
+        return queryset
+
+    async def get_object(self, pk):
+        try:
+            return await self.get_queryset().select_related("linked_habit").aget(pk=pk)
+        except Habit.DoesNotExist:
+            raise NotFound()
+
+    def get_data(self):
+        try:
+            return json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise ParseError("Некорректный JSON.")
+
+    def save(self, serializer, **kwargs):
+        """
+        Валидация и сохранение через HabitSerializer.
+        """
+        serializer.is_valid(raise_exception=True)
+        serializer.save(**kwargs)
+        pin_to_primary(self.request.user.pk)
+        return serializer.data
+
+
+class AsyncHabitListCreateView(AsyncHabitView):
+    """
+    Асинхронные список и создание привычек.
+
+    Список листается по курсору (created_at, id) только вперед.
+    """
+
+    paginator_class = HabitPaginator
+
+    async def get(self, request):
+        paginator = self.paginator_class()
+        try:
+            page_size = int(
+                request.GET.get(paginator.page_size_query_param, paginator.page_size)
+            )
+        except ValueError:
+            page_size = paginator.page_size
+        page_size = min(max(page_size, 1), paginator.max_page_size)
+
+        queryset = self.get_queryset().order_by(*paginator.ordering)
+        cursor = request.GET.get(paginator.cursor_query_param)
+        if cursor:
+            created_at, pk = decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        rows = [
+            row
+            async for row in queryset.values(*HabitRowSerializer.columns)[
+                : page_size + 1
+            ]
+        ]
+
+        next_url = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            query = request.GET.copy()
+            query[paginator.cursor_query_param] = encode_cursor(rows[-1])
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+        return JsonResponse(
+            {
+                "next": next_url,
+                "previous": None,
+                "results": HabitRowSerializer(rows, many=True).data,
+            }
+        )
+
+    async def post(self, request):
+        serializer = HabitSerializer(data=self.get_data())
+        data = await sync_to_async(self.save)(
+            serializer, owner=User(pk=request.user.pk)
+        )
+        return JsonResponse(data, status=status.HTTP_201_CREATED)
+
+
+class AsyncHabitDetailView(AsyncHabitView):
+    """
+    Асинхронные получение, обновление и удаление привычки.
+    """
+
+    async def get(self, request, pk):
+        return JsonResponse(HabitSerializer(await self.get_object(pk)).data)
+
+    async def put(self, request, pk, partial=False):
+        instance = await self.get_object(pk)
+        serializer = HabitSerializer(instance, data=self.get_data(), partial=partial)
+        return JsonResponse(await sync_to_async(self.save)(serializer))
+
+    async def patch(self, request, pk):
+        return await self.put(request, pk, partial=True)
+
+    async def delete(self, request, pk):
+        instance = await self.get_object(pk)
+        await sync_to_async(self.destroy)(instance)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+    def destroy(self, instance):
+        with transaction.atomic():
+            touch_dependents([instance])
+            create_tombstones([instance])
+            instance.delete()
+        pin_to_primary(self.request.user.pk)
@@ -0,0 +1,135 @@
+import datetime
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from habits.models import Habit
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback_unless(keep=False):
+    """
+    Транзакция для сгенерированных данных, откатываемая, если не задан keep.
+    """
+    try:
+        with transaction.atomic():
+            yield
+            if not keep:
+                raise Rollback
+    except Rollback:
+        pass
+
+
+def get_bench_owner():
+    """
+    Пользователь, которому принадлежат сгенерированные привычки.
+    """
+    return User.objects.get_or_create(
+        email="bench@example.com", defaults={"tg_chat_id": "0"}
+    )[0]
+
+
+def seed_habits(count, owner, now=None, due=0, batch_size=10000):
+    """
+    Генерация count привычек, первые due из которых уже пора отправлять.
+
+    Остальные напоминания равномерно распределены по ближайшей неделе.
+    На PostgreSQL строки вставляются одним INSERT ... SELECT generate_series.
+    """
+    now = now or timezone.now()
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO habits_habit (
+                    owner_id, place, time, action, is_pleasant, is_good,
+                    frequency, reward, continuation_time, is_public,
+                    created_at, updated_at, next_reminder
+                )
+                SELECT
+                    %(owner)s, 'Дома', '18:00', 'Действие ' || i, false, true,
+                    1 + i %% 7, 'Награда', 60, i %% 10 = 0,
+                    %(now)s - i * interval '1 second',
+                    %(now)s - i * interval '1 second',
+                    CASE WHEN i <= %(due)s
+                        THEN %(now)s - interval '1 minute'
+                        ELSE %(now)s + interval '1 hour'
+                            + (i %% 10080) * interval '1 minute'
+                    END
+                FROM generate_series(1, %(count)s) AS i
+                """,
+                {"owner": owner.pk, "now": now, "due": due, "count": count},
+            )
+        return
+
+    for start in range(1, count + 1, batch_size):
+        Habit.objects.bulk_create(
+            Habit(
+                owner=owner,
+                place="Дома",
+                time=datetime.time(hour=18),
+                action=f"Действие {i}",
+                is_pleasant=False,
+                is_good=True,
+                frequency=1 + i % 7,
+                reward="Награда",
+                continuation_time=60,
+                is_public=i % 10 == 0,
+                next_reminder=(
+                    now - datetime.timedelta(minutes=1)
+                    if i <= due
+                    else now + datetime.timedelta(hours=1, minutes=i % 10080)
+                ),
+            )
+            for i in range(start, min(start + batch_size, count + 1))
+        )
+
+
+def analyze():
+    """
+    Обновление статистики планировщика после генерации данных.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE habits_habit")
+
+
+def explain(queryset):
+    """
+    План выполнения запроса с фактическими временами.
+    """
+    if connection.vendor == "postgresql":
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def measure(func, repeat):
+    """
+    Замер времени выполнения func в миллисекундах.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "min": timings[0],
+        "p50": statistics.median(timings),
+        "p99": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "max": timings[-1],
+    }
+
+
+def format_timings(timings):
+    """
+    Строковое представление результатов замера.
+    """
+    return ", ".join(f"{name}={value:.3f} мс" for name, value in timings.items())
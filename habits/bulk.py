@@ -0,0 +1,154 @@
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from habits.models import Habit
+from habits.serializers import HabitSerializer
+from habits.signals import invalidate_public_feed, schedule_publish
+from habits.sync import create_tombstones, touch_dependents
+from users.models import User
+
+
+def load_linked_habits(items):
+    """
+    Все связанные привычки из элементов пакета одним запросом.
+    """
+    ids = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            ids.add(int(item.get("linked_habit")))
+        except (TypeError, ValueError):
+            pass
+    queryset = HabitSerializer().fields["linked_habit"].get_queryset()
+    return queryset.in_bulk(ids)
+
+
+def validate_items(serializers):
+    """
+    Проверка всех элементов пакета с ошибками по позициям.
+    """
+    valid = [serializer.is_valid() for serializer in serializers]
+    if not all(valid):
+        raise ValidationError(
+            [
+                {} if ok else serializer.errors
+                for ok, serializer in zip(valid, serializers)
+            ]
+        )
+
+
+def notify_changed(habits, was_public=False):
+    """
+    Уведомления, которые Habit.save отправил бы для каждой привычки.
+    """
+    schedule_publish([(habit.pk, habit.next_reminder) for habit in habits])
+    if was_public or any(habit.is_public for habit in habits):
+        invalidate_public_feed()
+
+
+def bulk_create_habits(owner_id, items, context):
+    """
+    Создание пакета привычек одним INSERT.
+
+    Каждый элемент проверяется правилами HabitSerializer; при ошибке хотя бы
+    в одном элементе ничего не сохраняется.
+    """
+    context = {**context, "linked_habits": load_linked_habits(items)}
+    serializers = [HabitSerializer(data=item, context=context) for item in items]
+    validate_items(serializers)
+
+    owner = User(pk=owner_id)
+    habits = []
+    for serializer in serializers:
+        habit = Habit(**{**serializer.validated_data, "owner": owner})
+        habit.next_reminder = habit.calculate_next_reminder()
+        habits.append(habit)
+
+    with transaction.atomic():
+        Habit.objects.bulk_create(habits)
+        notify_changed(habits)
+    return habits
+
+
+def bulk_update_habits(owner_id, items, context):
+    """
+    Частичное обновление пакета привычек владельца одним UPDATE.
+
+    Привычки загружаются и блокируются одним запросом, next_reminder
+    пересчитывается только при изменении расписания.
+    """
+    ids = set()
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get("id"), int):
+            ids.add(item["id"])
+
+    with transaction.atomic():
+        instances = (
+            Habit.objects.filter(owner_id=owner_id)
+            .select_related("linked_habit")
+            .select_for_update(of=("self",))
+            .in_bulk(ids)
+        )
+        context = {**context, "linked_habits": load_linked_habits(items)}
+        serializers = []
+        errors = []
+        for item in items:
+            instance = instances.get(item.get("id")) if isinstance(item, dict) else None
+            if instance is None:
+                errors.append({"id": ["Привычка не найдена."]})
+                serializers.append(None)
+                continue
+            serializer = HabitSerializer(
+                instance, data=item, partial=True, context=context
+            )
+            errors.append({} if serializer.is_valid() else serializer.errors)
+            serializers.append(serializer)
+        if any(errors):
+            raise ValidationError(errors)
+
+        now = timezone.now()
+        fields = {"updated_at"}
+        habits = []
+        was_public = False
+        for serializer in serializers:
+            habit = serializer.instance
+            was_public = was_public or habit.is_public
+            for name, value in serializer.validated_data.items():
+                setattr(habit, name, value)
+            dirty_fields = set(habit.get_dirty_fields())
+            if dirty_fields & set(Habit.SCHEDULE_FIELDS):
+                habit.next_reminder = habit.calculate_next_reminder()
+                dirty_fields.add("next_reminder")
+            habit.updated_at = now
+            fields |= dirty_fields
+            habits.append(habit)
+
+        Habit.objects.bulk_update(habits, sorted(fields))
+        notify_changed(habits, was_public)
+    return habits
+
+
+def bulk_delete_habits(owner_id, ids):
+    """
+    Удаление пакета привычек владельца с отметками для синхронизации.
+    """
+    if not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+        raise ValidationError("Ожидается список идентификаторов привычек.")
+
+    with transaction.atomic():
+        habits = list(
+            Habit.objects.filter(owner_id=owner_id, pk__in=ids)
+            .select_for_update()
+            .only("pk", "owner_id", "is_public")
+        )
+        found = {habit.pk for habit in habits}
+        errors = [{} if pk in found else {"id": ["Привычка не найдена."]} for pk in ids]
+        if any(errors):
+            raise ValidationError(errors)
+
+        touch_dependents(habits)
+        create_tombstones(habits)
+        Habit.objects.filter(pk__in=found).delete()
+    return len(found)
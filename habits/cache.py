@@ -0,0 +1,130 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+namespaces = {}
+
+
+def incr(key):
+    """
+    Увеличение счетчика в кэше с созданием при отсутствии.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+class CacheNamespace:
+    """
+    Группа ключей кэша с общей версией, защитой от лавины и счетчиками.
+
+    Версия входит в каждый ключ, поэтому bump инвалидирует все значения
+    группы одной операцией, а старые ключи истекают сами. При промахе
+    значение вычисляет один процесс, взявший блокировку, остальные ждут
+    его результата не дольше CACHE_LOCK_TIMEOUT.
+    """
+
+    lock_poll_interval = 0.05
+
+    def __init__(self, name, timeout_setting=None):
+        self.name = name
+        self.timeout_setting = timeout_setting
+        self.version_key = f"{name}:version"
+        self.hits_key = f"{name}:hits"
+        self.misses_key = f"{name}:misses"
+        namespaces[name] = self
+
+    def get_timeout(self):
+        if self.timeout_setting:
+            return getattr(settings, self.timeout_setting)
+        return None
+
+    def get_version(self):
+        """
+        Текущая версия группы.
+
+        Начальная версия берется от времени, чтобы после вытеснения ключа
+        не вернуться к номеру, под которым уже лежат устаревшие значения.
+        """
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), timeout=None)
+            version = cache.get(self.version_key)
+        return version
+
+    def bump(self):
+        """
+        Инвалидация всех значений группы.
+        """
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, time.time_ns(), timeout=None)
+
+    def make_key(self, *parts):
+        """
+        Ключ значения в текущей версии группы.
+        """
+        digest = hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+        return f"{self.name}:{self.get_version()}:{digest}"
+
+    def get(self, key):
+        """
+        Значение из кэша или None с учетом попадания или промаха.
+        """
+        value = cache.get(key)
+        incr(self.misses_key if value is None else self.hits_key)
+        return value
+
+    def set(self, key, value):
+        cache.set(key, value, timeout=self.get_timeout())
+
+    def get_or_set(self, key, compute):
+        """
+        Значение из кэша или результат compute, вычисленный один раз.
+
+        Ключ вычисляется до чтения из базы: если данные изменятся во время
+        запроса, значение ляжет под старую версию и не будет отдано.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f"{key}:lock"
+        lock_timeout = settings.CACHE_LOCK_TIMEOUT
+        deadline = time.monotonic() + lock_timeout
+        locked = cache.add(lock_key, True, timeout=lock_timeout)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            locked = cache.add(lock_key, True, timeout=lock_timeout)
+
+        try:
+            value = compute()
+            self.set(key, value)
+            return value
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    def get_stats(self):
+        """
+        Число попаданий и промахов и доля попаданий.
+        """
+        values = cache.get_many([self.hits_key, self.misses_key])
+        hits = values.get(self.hits_key, 0)
+        misses = values.get(self.misses_key, 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+public_feed = CacheNamespace("habits:public_feed", "PUBLIC_FEED_CACHE_TIMEOUT")
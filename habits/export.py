@@ -0,0 +1,57 @@
+import csv
+import json
+
+
+class Echo:
+    """
+    Псевдофайл для csv.writer, возвращающий записанную строку.
+    """
+
+    def write(self, value):
+        return value
+
+
+def join_lines(lines, size=500):
+    """
+    Склейка строк в куски по size, чтобы не писать в сокет каждую строку.
+    """
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def iter_ndjson(rows, serializer):
+    """
+    Строки NDJSON: по одному JSON-объекту привычки на строку.
+    """
+    for row in rows:
+        yield json.dumps(serializer.to_representation(row), ensure_ascii=False) + "\n"
+
+
+def iter_csv(rows, serializer):
+    """
+    Строки CSV с заголовком из имен полей.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _, _ in serializer.fields])
+    for row in rows:
+        yield writer.writerow(serializer.to_representation(row).values())
+
+
+def iter_export(rows, serializer, export_type):
+    """
+    Куски выгрузки в формате export_type.
+    """
+    iter_lines, _ = EXPORT_TYPES[export_type]
+    return join_lines(iter_lines(rows, serializer))
+
+
+EXPORT_TYPES = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv; charset=utf-8"),
+}
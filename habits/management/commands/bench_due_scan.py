@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from habits.benchmarks import (analyze, explain, format_timings,
+                               get_bench_owner, measure, rollback_unless,
+                               seed_habits)
+from habits.services import get_due_habits
+
+
+class Command(BaseCommand):
+    help = "Benchmark the due-reminder scan on generated habits"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--due", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=100)
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять сгенерированные строки"
+        )
+
+    def handle(self, *args, **options):
+        with rollback_unless(options["keep"]):
+            self.run(options)
+
+    def run(self, options):
+        now = timezone.now()
+        self.stdout.write(f"Генерация {options['rows']} привычек...")
+        seed_habits(options["rows"], get_bench_owner(), now=now, due=options["due"])
+        analyze()
+
+        limit = settings.TELEGRAM_DISPATCH_BATCH_SIZE
+        queryset = (
+            get_due_habits(now)
+            .order_by("next_reminder", "pk")
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("pk", "next_reminder", "frequency")[:limit]
+        )
+        self.stdout.write(explain(queryset))
+
+        timings = measure(lambda: list(queryset.all()), options["repeat"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Выборка due-привычек: {format_timings(timings)}")
+        )
@@ -0,0 +1,62 @@
+import time
+import tracemalloc
+
+from django.core.management import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from habits.benchmarks import (analyze, get_bench_owner, rollback_unless,
+                               seed_habits)
+from habits.views import HabitExportAPIView
+
+
+class Command(BaseCommand):
+    help = "Benchmark memory and throughput of the streaming habit export"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--type", choices=["ndjson", "csv"], default="ndjson")
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять сгенерированные строки"
+        )
+
+    def handle(self, *args, **options):
+        with rollback_unless(options["keep"]):
+            self.run(options)
+
+    def run(self, options):
+        owner = get_bench_owner()
+        self.stdout.write(f"Генерация {options['rows']} привычек...")
+        seed_habits(options["rows"], owner)
+        analyze()
+
+        request = APIRequestFactory().get("/habits/export/", {"type": options["type"]})
+        force_authenticate(request, user=owner)
+
+        started = time.perf_counter()
+        rows, size = self.consume(request)
+        elapsed = time.perf_counter() - started
+
+        # Второй проход под tracemalloc: трассировка сильно замедляет выгрузку.
+        tracemalloc.start()
+        self.consume(request)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Выгружено строк: {rows}, {size / 2**20:.1f} МиБ за {elapsed:.2f} с "
+                f"({rows / elapsed:.0f} в секунду), "
+                f"пик памяти {peak / 2**20:.1f} МиБ"
+            )
+        )
+
+    def consume(self, request):
+        """
+        Чтение ответа выгрузки целиком без накопления в памяти.
+        """
+        response = HabitExportAPIView.as_view()(request)
+        rows = size = 0
+        for chunk in response.streaming_content:
+            rows += chunk.count(b"\n")
+            size += len(chunk)
+        return rows, size
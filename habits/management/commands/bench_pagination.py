@@ -0,0 +1,78 @@
+from django.core.management import BaseCommand, CommandError
+from rest_framework.pagination import Cursor, PageNumberPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from habits.benchmarks import (analyze, format_timings, get_bench_owner,
+                               measure, rollback_unless, seed_habits)
+from habits.models import Habit
+from habits.paginators import HabitPaginator
+from habits.views import HabitListAPIView
+
+
+class OffsetPaginator(PageNumberPagination):
+    page_size = HabitPaginator.page_size
+
+
+class Command(BaseCommand):
+    help = "Benchmark offset and cursor pagination of the habit list"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--page", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять сгенерированные строки"
+        )
+
+    def handle(self, *args, **options):
+        with rollback_unless(options["keep"]):
+            self.run(options)
+
+    def run(self, options):
+        if options["page"] < 1:
+            raise CommandError("--page должен быть не меньше 1")
+        owner = get_bench_owner()
+        self.stdout.write(f"Генерация {options['rows']} привычек...")
+        seed_habits(options["rows"], owner)
+        analyze()
+
+        factory = APIRequestFactory()
+        page = options["page"]
+        page_size = HabitPaginator.page_size
+
+        # Первая страница открывается без курсора, остальные - с позиции
+        # последней строки предыдущей страницы.
+        cursor_url = "/habits/"
+        if page > 1:
+            position = (
+                Habit.objects.filter(owner=owner)
+                .order_by(*HabitPaginator.ordering)
+                .values_list("created_at", flat=True)[(page - 1) * page_size - 1]
+            )
+            paginator = HabitPaginator()
+            paginator.base_url = "/habits/"
+            cursor_url = paginator.encode_cursor(
+                Cursor(offset=0, reverse=False, position=str(position))
+            )
+
+        views = {
+            "OFFSET": (
+                HabitListAPIView.as_view(pagination_class=OffsetPaginator),
+                f"/habits/?page={page}",
+            ),
+            "курсор": (HabitListAPIView.as_view(), cursor_url),
+        }
+        for name, (view, url) in views.items():
+
+            def fetch():
+                request = factory.get(url)
+                force_authenticate(request, user=owner)
+                response = view(request)
+                assert response.status_code == 200, response.data
+
+            timings = measure(fetch, options["repeat"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Страница {page}, {name}: {format_timings(timings)}"
+                )
+            )
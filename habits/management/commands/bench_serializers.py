@@ -0,0 +1,43 @@
+from django.core.management import BaseCommand
+
+from habits.benchmarks import (format_timings, get_bench_owner, measure,
+                               rollback_unless, seed_habits)
+from habits.models import Habit
+from habits.serializers import HabitRowSerializer, HabitSerializer
+
+
+class Command(BaseCommand):
+    help = "Benchmark HabitSerializer against HabitRowSerializer on list pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-sizes", type=int, nargs="+", default=[100, 1000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rollback_unless():
+            self.run(options)
+
+    def run(self, options):
+        owner = get_bench_owner()
+        seed_habits(max(options["page_sizes"]), owner)
+        queryset = Habit.objects.filter(owner=owner).order_by("-created_at", "-id")
+
+        for page_size in options["page_sizes"]:
+            serializers = {
+                "HabitSerializer": lambda: HabitSerializer(
+                    queryset[:page_size], many=True
+                ).data,
+                "HabitRowSerializer": lambda: HabitRowSerializer(
+                    queryset.values(*HabitRowSerializer.columns)[:page_size],
+                    many=True,
+                ).data,
+            }
+            for name, func in serializers.items():
+                timings = measure(func, options["repeat"])
+                rate = page_size / timings["p50"] * 1000
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{name}, страница {page_size}: {rate:.0f} строк/с "
+                        f"({format_timings(timings)})"
+                    )
+                )
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from habits.cache import namespaces
+
+
+class Command(BaseCommand):
+    help = "Show cache hits, misses and hit ratio per namespace"
+
+    def handle(self, *args, **options):
+        for name, namespace in sorted(namespaces.items()):
+            stats = namespace.get_stats()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name}: попаданий {stats['hits']}, промахов {stats['misses']}, "
+                    f"доля попаданий {stats['hit_ratio']:.1%}"
+                )
+            )
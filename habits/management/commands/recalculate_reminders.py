@@ -0,0 +1,38 @@
+import time
+
+from django.core.management import BaseCommand
+
+from habits.models import Habit
+from habits.signals import invalidate_public_feed, publish_reload
+
+
+class Command(BaseCommand):
+    help = "Recalculate next_reminder for all habits"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--per-row",
+            action="store_true",
+            help="Пересчет через Habit.save для каждой строки (для сравнения)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["per_row"]:
+            updated = 0
+            for habit in Habit.objects.iterator(chunk_size=2000):
+                habit.next_reminder = habit.calculate_next_reminder()
+                habit.save(update_fields=["next_reminder", "updated_at"])
+                updated += 1
+        else:
+            updated = Habit.objects.recalculate_next_reminders()
+            publish_reload()
+            invalidate_public_feed()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано привычек: {updated} за {elapsed:.2f} с "
+                f"({updated / elapsed if elapsed else 0:.0f} в секунду)"
+            )
+        )
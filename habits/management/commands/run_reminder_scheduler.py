@@ -0,0 +1,37 @@
+import signal
+import threading
+
+from django.core.management import BaseCommand
+
+from habits.scheduler import ReminderScheduler, disable_polling_task
+
+
+class Command(BaseCommand):
+    help = "Run the in-memory reminder scheduler"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horizon", type=int, help="Горизонт загрузки напоминаний в секундах"
+        )
+
+    def handle(self, *args, **options):
+        if disable_polling_task():
+            self.stdout.write("Ежеминутный опрос в celery beat отключен")
+
+        scheduler = ReminderScheduler(horizon=options["horizon"])
+        stop_event = threading.Event()
+
+        def shutdown(*args):
+            stop_event.set()
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        listener = threading.Thread(
+            target=scheduler.listen, args=(stop_event,), daemon=True
+        )
+        listener.start()
+        self.stdout.write(self.style.SUCCESS("Планировщик напоминаний запущен"))
+        scheduler.run(stop_event)
+        listener.join()
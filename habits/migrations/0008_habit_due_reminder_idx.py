@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0007_alter_habit_continuation_time_alter_habit_frequency"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                condition=models.Q(("owner__isnull", False)),
+                fields=["next_reminder"],
+                name="habit_due_reminder_idx",
+            ),
+        ),
+    ]
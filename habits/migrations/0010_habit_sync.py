@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0009_habit_cursor_pagination_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HabitTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "habit_id",
+                    models.BigIntegerField(verbose_name="идентификатор привычки"),
+                ),
+                (
+                    "deleted_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="дата и время удаления",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "удаленная привычка",
+                "verbose_name_plural": "удаленные привычки",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                fields=["owner", "updated_at", "id"], name="habit_owner_updated_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="habittombstone",
+            name="owner",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="создатель привычки",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="habittombstone",
+            index=models.Index(
+                fields=["owner", "deleted_at", "id"], name="habit_tombstone_owner_idx"
+            ),
+        ),
+    ]
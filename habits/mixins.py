@@ -0,0 +1,281 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from config.routers import (choose_replica, is_pinned_to_primary,
+                            pin_to_primary, primary_reads, replica_reads)
+from habits.cache import public_feed
+
+
+class OwnerQuerySetMixin:
+    """
+    Ограничение выборки привычками пользователя; суперюзеру доступны все.
+
+    Чужая привычка отсекается в том же запросе, что и загружается,
+    поэтому для проверки прав не нужен запрос к пользователю.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(owner_id=self.request.user.pk)
+
+
+class ReplicaReadMixin:
+    """
+    Чтение с реплики для безопасных запросов.
+
+    Пользователь, недавно изменявший привычки, читает с основной базы,
+    чтобы сразу видеть свои изменения.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned_to_primary(request.user.pk):
+            self.replica_reads_token = replica_reads.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "replica_reads_token", None)
+        if token is not None:
+            replica_reads.reset(token)
+            self.replica_reads_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReadYourWritesMixin:
+    """
+    Закрепление пользователя за основной базой после успешных изменений.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка условных GET-запросов по ETag и Last-Modified.
+
+    Валидаторы вычисляются из updated_at до сериализации, и при совпадении
+    с If-None-Match или If-Modified-Since отдается пустой ответ 304.
+    """
+
+    def make_etag(self, *parts):
+        """
+        ETag из значений, определяющих ответ.
+        """
+        key = ":".join(str(part) for part in parts)
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def get_not_modified(self, request, etag, last_modified):
+        """
+        Ответ 304, если у клиента актуальная версия, иначе None.
+        """
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        """
+        Заголовки ETag и Last-Modified ответа.
+        """
+        response.headers["ETag"] = etag
+        if last_modified:
+            response.headers["Last-Modified"] = http_date(last_modified.timestamp())
+        return response
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """
+    Условный GET для списка по запрошенной странице.
+
+    Валидатор строится из той же keyset-выборки пагинатора, что и ответ,
+    но только по id и updated_at: ETag зависит от адреса, пользователя,
+    наличия следующей страницы и пар (id, updated_at) строк страницы,
+    поэтому меняется и при удалении привычки со страницы. Удаление не
+    сдвигает max(updated_at), так что If-Modified-Since без If-None-Match
+    для списков не проверяется, а Last-Modified отдается справочно.
+    """
+
+    def get_page_state(self, queryset):
+        """
+        Пары (id, updated_at) строк запрошенной страницы.
+        """
+        ordering = getattr(self.paginator, "ordering", ())
+        columns = {"pk", "updated_at", *(name.lstrip("-") for name in ordering)}
+        rows = queryset.values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            page = list(rows)
+        return [(row["pk"], row["updated_at"]) for row in page]
+
+    def get_list_validators(self, request):
+        """
+        ETag и Last-Modified запрошенной страницы.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        state = self.get_page_state(queryset)
+        last_modified = max((updated_at for _, updated_at in state), default=None)
+        etag = self.make_etag(
+            request.get_full_path(),
+            request.user.pk,
+            getattr(self.paginator, "has_next", None),
+            *(f"{pk}@{updated_at.isoformat()}" for pk, updated_at in state),
+        )
+        return etag, last_modified
+
+    def get_list_response(self, request, *args, **kwargs):
+        """
+        Ответ со страницей, если у клиента нет актуальной версии.
+        """
+        return super().list(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(request)
+        response = self.get_not_modified(request, etag, None)
+        if response is None:
+            response = self.get_list_response(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    """
+    Условный GET для одной привычки по ее updated_at.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.make_etag(request.get_full_path(), instance.pk, instance.updated_at)
+
+        response = self.get_not_modified(request, etag, instance.updated_at)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        return self.set_validators(response, etag, instance.updated_at)
+
+
+class PublicFeedCacheMixin(ConditionalListMixin):
+    """
+    Отдача страниц публичной ленты из общего кэша.
+
+    Лента одинакова для всех пользователей, кроме суперюзера,
+    которому видны все привычки, поэтому его запросы не кэшируются.
+    Промах заполняется с основной базы: страница с отстающей реплики
+    легла бы под новую версию и отдавалась бы всем до истечения кэша.
+    ETag кэшируемой страницы строится из ключа кэша с версией ленты,
+    поэтому попадание и ответ 304 обходятся без запросов к базе.
+    """
+
+    def get_public_feed_key(self, request):
+        if not hasattr(self, "_public_feed_key"):
+            self._public_feed_key = public_feed.make_key(request.build_absolute_uri())
+        return self._public_feed_key
+
+    def get_list_validators(self, request):
+        if request.user.is_superuser:
+            return super().get_list_validators(request)
+        return self.make_etag(self.get_public_feed_key(request)), None
+
+    def get_list_response(self, request, *args, **kwargs):
+        if request.user.is_superuser:
+            return super().get_list_response(request, *args, **kwargs)
+
+        key = self.get_public_feed_key(request)
+        get_page = super().get_list_response
+
+        def compute():
+            with primary_reads():
+                return get_page(request, *args, **kwargs).data
+
+        return Response(public_feed.get_or_set(key, compute))
+
+
+class SparseFieldsMixin:
+    """
+    Выбор полей ответа параметром ?fields=id,time,...
+    """
+
+    fields_query_param = "fields"
+
+    def get_requested_fields(self, available):
+        """
+        Запрошенные поля из числа available или None, если параметра нет.
+        """
+        value = self.request.query_params.get(self.fields_query_param)
+        if not value:
+            return None
+        fields = [name.strip() for name in value.split(",") if name.strip()]
+        if not fields:
+            raise ValidationError({self.fields_query_param: "Не указаны поля."})
+        unknown = [name for name in fields if name not in available]
+        if unknown:
+            raise ValidationError(
+                {self.fields_query_param: f"Неизвестные поля: {', '.join(unknown)}."}
+            )
+        return fields
+
+
+class SparseObjectMixin(SparseFieldsMixin):
+    """
+    Выбор полей для представлений одного объекта.
+
+    Из базы через only() читаются только запрошенные поля и loaded_fields,
+    нужные самому представлению (проверка прав, ETag).
+    """
+
+    loaded_fields = ("id",)
+
+    def get_sparse_fields(self):
+        if not hasattr(self, "_sparse_fields"):
+            self._sparse_fields = self.get_requested_fields(
+                self.get_serializer_class()().fields
+            )
+        return self._sparse_fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            queryset = queryset.only(*fields, *self.loaded_fields)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault("fields", self.get_sparse_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class RowListMixin(SparseFieldsMixin):
+    """
+    Список из строк values() с сериализатором row_serializer_class.
+
+    Для страницы не создаются модели и поля DRF, что заметно дешевле
+    на больших страницах. Пагинатор работает со словарями строк.
+    С параметром fields из базы читаются только нужные колонки и поля
+    сортировки пагинатора.
+    """
+
+    row_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.row_serializer_class
+        fields = self.get_requested_fields(serializer_class.field_names)
+        columns = serializer_class.get_columns(fields)
+        ordering = getattr(self.paginator, "ordering", ())
+        columns += tuple(
+            name.lstrip("-") for name in ordering if name.lstrip("-") not in columns
+        )
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                serializer_class(page, many=True, fields=fields).data
+            )
+        return Response(serializer_class(queryset, many=True, fields=fields).data)
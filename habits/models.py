@@ -1,10 +1,92 @@
 import datetime
 
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import (ExtractHour, ExtractMinute,
+                                        ExtractSecond)
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 
+def calculate_next_reminder(time, frequency, now=None):
+    """
+    Расчет следующего напоминания по времени и периодичности привычки.
+    """
+    now = now or timezone.now()
+
+    today_with_habit_time = timezone.make_aware(
+        timezone.datetime.combine(now.date(), time)
+    )
+
+    if today_with_habit_time <= now:
+        next_date = now.date() + timezone.timedelta(days=frequency)
+    else:
+        next_date = now.date()
+
+    next_reminder_datetime = timezone.make_aware(
+        timezone.datetime.combine(next_date, time)
+    )
+
+    return next_reminder_datetime
+
+
+class Seconds(models.Func):
+    """
+    Интервал из числа секунд.
+    """
+
+    template = "make_interval(secs => %(expressions)s)"
+    output_field = models.DurationField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # В sqlite интервалы хранятся в микросекундах.
+        return super().as_sql(
+            compiler, connection, template="(%(expressions)s * 1000000)"
+        )
+
+
+class HabitQuerySet(models.QuerySet):
+    """
+    Запросы к привычкам.
+    """
+
+    def recalculate_next_reminders(self, now=None):
+        """
+        Массовый пересчет next_reminder от текущего момента времени.
+
+        Значение считается в базе одним UPDATE по той же формуле, что и
+        calculate_next_reminder: полночь сегодняшней даты плюс time, а если
+        это время уже прошло, то еще frequency дней.
+        """
+        now = now or timezone.now()
+        midnight = timezone.make_aware(
+            timezone.datetime.combine(now.date(), datetime.time.min)
+        )
+        elapsed = now - midnight
+        if elapsed < datetime.timedelta():
+            passed = models.Q(pk__in=[])
+        elif elapsed >= datetime.timedelta(days=1):
+            passed = models.Q()
+        else:
+            passed = models.Q(time__lte=(datetime.datetime.min + elapsed).time())
+
+        hours = ExtractHour("time") * 3600
+        minutes = ExtractMinute("time") * 60
+        delay = models.Case(
+            models.When(passed, then=F("frequency") * 86400),
+            default=0,
+            output_field=models.IntegerField(),
+        )
+        seconds = hours + minutes + ExtractSecond("time") + delay
+        return self.update(
+            next_reminder=models.ExpressionWrapper(
+                models.Value(midnight) + Seconds(seconds),
+                output_field=models.DateTimeField(),
+            ),
+            updated_at=now,
+        )
+
+
 class Habit(models.Model):
     """
     Модель привычки.
@@ -56,10 +138,34 @@ class Habit(models.Model):
         blank=True,
     )
 
+    objects = HabitQuerySet.as_manager()
+
+    SCHEDULE_FIELDS = ("time", "frequency")
+
     class Meta:
         verbose_name = "привычка"
         verbose_name_plural = "привычки"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["next_reminder"],
+                condition=models.Q(owner__isnull=False),
+                name="habit_due_reminder_idx",
+            ),
+            models.Index(
+                fields=["owner", "-created_at", "-id"],
+                name="habit_owner_created_idx",
+            ),
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(is_public=True),
+                name="habit_public_created_idx",
+            ),
+            models.Index(
+                fields=["owner", "updated_at", "id"],
+                name="habit_owner_updated_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.owner.email}: {self.action} в {self.time}"
@@ -94,26 +200,115 @@ class Habit(models.Model):
         """
         Расчет следующего напоминания от текущего момента времени.
         """
-        now = timezone.now()
+        return calculate_next_reminder(self.time, self.frequency)
 
-        today_with_habit_time = timezone.make_aware(
-            timezone.datetime.combine(now.date(), self.time)
-        )
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Запоминание загруженных значений для отслеживания изменений.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_dirty_fields(self):
+        """
+        Поля, измененные после загрузки из базы, или None для новой привычки.
+        """
+        loaded_values = getattr(self, "_loaded_values", None)
+        if self._state.adding or loaded_values is None:
+            return None
+        dirty_fields = []
+        for field in self._meta.concrete_fields:
+            if field.attname not in loaded_values:
+                # Отложенное при загрузке поле, которому присвоили значение.
+                if field.attname in self.__dict__:
+                    dirty_fields.append(field.name)
+                continue
+            if getattr(self, field.attname) != loaded_values[field.attname]:
+                dirty_fields.append(field.name)
+        return dirty_fields
+
+    def save(self, *args, **kwargs):
+        """
+        Сохранение только измененных полей привычки.
 
-        if today_with_habit_time <= now:
-            next_date = now.date() + timezone.timedelta(days=self.frequency)
+        next_reminder пересчитывается лишь для новой привычки и при изменении
+        time или frequency, иначе значение в базе не перезаписывается.
+        """
+        update_fields = kwargs.get("update_fields")
+        dirty_fields = self.get_dirty_fields()
+
+        if dirty_fields is None or self.next_reminder is None:
+            schedule_changed = True
         else:
-            next_date = now.date()
+            schedule_changed = bool(set(dirty_fields) & set(self.SCHEDULE_FIELDS))
 
-        next_reminder_datetime = timezone.make_aware(
-            timezone.datetime.combine(next_date, self.time)
-        )
+        if schedule_changed:
+            self.next_reminder = self.calculate_next_reminder()
+            if dirty_fields is not None:
+                dirty_fields.append("next_reminder")
+            if update_fields is not None:
+                update_fields = {*update_fields, "next_reminder"}
 
-        return next_reminder_datetime
+        if update_fields is None and dirty_fields is not None:
+            update_fields = {*dirty_fields, "updated_at"}
+        if update_fields is not None:
+            kwargs["update_fields"] = update_fields
 
-    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.remember_loaded_values()
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.remember_loaded_values(fields)
+
+    def remember_loaded_values(self, fields=None):
         """
-        Расчет next_reminder привычки при сохранении.
+        Обновление снимка значений, совпадающих с базой.
+
+        Без fields снимок строится заново по всем загруженным полям.
         """
-        self.next_reminder = self.calculate_next_reminder()
-        super().save(*args, **kwargs)
+        if fields is None:
+            deferred_fields = self.get_deferred_fields()
+            self._loaded_values = {
+                field.attname: getattr(self, field.attname)
+                for field in self._meta.concrete_fields
+                if field.attname not in deferred_fields
+            }
+            return
+        loaded_values = getattr(self, "_loaded_values", None)
+        if loaded_values is None:
+            return
+        for name in fields:
+            attname = self._meta.get_field(name).attname
+            loaded_values[attname] = getattr(self, attname)
+
+
+class HabitTombstone(models.Model):
+    """
+    Отметка об удаленной привычке для дельта-синхронизации клиентов.
+    """
+
+    habit_id = models.BigIntegerField(verbose_name="идентификатор привычки")
+    owner = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        verbose_name="создатель привычки",
+    )
+    deleted_at = models.DateTimeField(
+        verbose_name="дата и время удаления", default=timezone.now
+    )
+
+    class Meta:
+        verbose_name = "удаленная привычка"
+        verbose_name_plural = "удаленные привычки"
+        indexes = [
+            models.Index(
+                fields=["owner", "deleted_at", "id"],
+                name="habit_tombstone_owner_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}: {self.habit_id} удалена {self.deleted_at}"
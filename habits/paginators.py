@@ -1,9 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination
 
 
-class HabitPaginator(PageNumberPagination):
+class HabitPaginator(CursorPagination):
     """
-    Пагинатор для привычки.
+    Курсорный пагинатор для привычки.
+
+    Страница выбирается по позиции (-created_at, -id) без COUNT и OFFSET,
+    поэтому время ответа не зависит от номера страницы.
     """
 
     page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "-id")
@@ -7,4 +7,4 @@ class IsOwner(BasePermission):
     """
 
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return request.user.is_superuser or obj.owner_id == request.user.pk
@@ -0,0 +1,217 @@
+import heapq
+import json
+import logging
+import threading
+
+import redis
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_celery_beat.models import PeriodicTask
+
+from habits.services import (claim_digest_companions, claim_due_habits,
+                             get_due_habits, release_after_failure,
+                             split_into_batches)
+from habits.signals import RELOAD_MESSAGE, get_redis
+from habits.tasks import send_tg_notifications_batch
+
+logger = logging.getLogger(__name__)
+
+POLLING_TASK_NAME = "check_habits_to_notify_every_minute"
+
+
+def disable_polling_task():
+    """
+    Отключение ежеминутного опроса, сохраненного в базе celery beat.
+
+    DatabaseScheduler не удаляет задачи, пропавшие из CELERY_BEAT_SCHEDULE,
+    поэтому без этого опрос продолжил бы работать рядом с планировщиком.
+    """
+    return PeriodicTask.objects.filter(name=POLLING_TASK_NAME, enabled=True).update(
+        enabled=False
+    )
+
+
+class ReminderScheduler:
+    """
+    Планировщик напоминаний на min-куче вместо ежеминутного опроса базы.
+
+    В памяти держатся напоминания на horizon вперед; процесс спит ровно до
+    ближайшего из них. Изменения расписания приходят через канал редиса,
+    а при старте, переподключении и выходе за горизонт куча перечитывается
+    из базы.
+    """
+
+    def __init__(self, horizon=None):
+        self.horizon = timezone.timedelta(
+            seconds=horizon or settings.REMINDER_SCHEDULER_HORIZON
+        )
+        self._heap = []
+        self._entries = {}
+        self._loaded_until = None
+        self._condition = threading.Condition()
+        self._shard = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reload(self, now=None):
+        """
+        Загрузка из базы всех напоминаний до конца горизонта.
+        """
+        now = now or timezone.now()
+        loaded_until = now + self.horizon
+        rows = get_due_habits(loaded_until).values_list("pk", "next_reminder")
+        entries = dict(rows.iterator(chunk_size=10000))
+        heap = [(when, pk) for pk, when in entries.items()]
+        heapq.heapify(heap)
+        with self._condition:
+            self._entries = entries
+            self._heap = heap
+            self._loaded_until = loaded_until
+            self._condition.notify()
+        logger.info("Загружено напоминаний: %s до %s", len(entries), loaded_until)
+
+    def schedule(self, habit_id, when):
+        """
+        Добавление, перенос или отмена (when=None) напоминания.
+
+        Устаревшие записи остаются в куче и отбрасываются при извлечении.
+        """
+        with self._condition:
+            if when is None or self._loaded_until is None or when > self._loaded_until:
+                self._entries.pop(habit_id, None)
+                return
+            if self._entries.get(habit_id) == when:
+                return
+            self._entries[habit_id] = when
+            heapq.heappush(self._heap, (when, habit_id))
+            self._condition.notify()
+
+    def pop_due(self, now):
+        """
+        Извлечение привычек, время напоминания которых наступило.
+        """
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                when, habit_id = heapq.heappop(self._heap)
+                if self._entries.get(habit_id) == when:
+                    del self._entries[habit_id]
+                    due.append(habit_id)
+        return due
+
+    def seconds_until_next(self, now):
+        """
+        Время до ближайшего напоминания или до конца горизонта.
+        """
+        with self._condition:
+            wake_at = self._loaded_until
+            if self._heap and self._heap[0][0] < wake_at:
+                wake_at = self._heap[0][0]
+        return (wake_at - now).total_seconds()
+
+    def dispatch(self, habit_ids):
+        """
+        Захват наступивших привычек и постановка задач на отправку.
+
+        Если задачу не удалось поставить, захват оставшихся пачек снимается,
+        чтобы напоминания ушли на следующем пробуждении.
+        """
+        now = timezone.now()
+        claimed = claim_due_habits(now, len(habit_ids), habit_ids=habit_ids)
+        claimed += claim_digest_companions(
+            now, claimed, settings.TELEGRAM_DISPATCH_BATCH_SIZE
+        )
+        batches = split_into_batches(claimed, settings.TELEGRAM_DISPATCH_BATCH_SIZE)
+        for number, batch in enumerate(batches):
+            try:
+                send_tg_notifications_batch.delay(self._shard, batch)
+            except Exception:
+                logger.exception("Не удалось поставить задачу рассылки")
+                release_after_failure(
+                    [], [pk for ids in batches[number:] for pk in ids]
+                )
+                return [pk for ids in batches[:number] for pk in ids]
+            self._shard += 1
+        return claimed
+
+    def run(self, stop_event):
+        """
+        Основной цикл: сон до ближайшего напоминания и отправка наступивших.
+
+        Процесс не проходит цикл запроса, поэтому устаревшие и оборванные
+        соединения с базой закрываются после каждого пробуждения.
+        """
+        self.reload()
+        while not stop_event.is_set():
+            close_old_connections()
+            now = timezone.now()
+            if now >= self._loaded_until:
+                self.reload(now)
+                continue
+
+            # Таймаут считается под той же блокировкой, что и ожидание,
+            # иначе notify из schedule или stop между ними будет потерян.
+            with self._condition:
+                timeout = self.seconds_until_next(now)
+                if timeout > 0:
+                    if not stop_event.is_set():
+                        self._condition.wait(timeout)
+                    continue
+
+            due = self.pop_due(now)
+            if due:
+                self.dispatch(due)
+
+    def stop(self):
+        """
+        Пробуждение основного цикла для завершения.
+        """
+        with self._condition:
+            self._condition.notify_all()
+
+    def listen(self, stop_event, reconnect_delay=5):
+        """
+        Прием изменений расписания из канала редиса.
+
+        После переподключения куча перечитывается из базы, так как
+        сообщения, опубликованные во время разрыва, потеряны.
+        """
+        while not stop_event.is_set():
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(settings.REMINDER_SCHEDULER_CHANNEL)
+                while not stop_event.is_set():
+                    message = pubsub.get_message(timeout=1)
+                    if message:
+                        close_old_connections()
+                        self.apply_message(message["data"])
+            except redis.RedisError as exc:
+                logger.warning("Потеряно соединение с редисом: %s", exc)
+                stop_event.wait(reconnect_delay)
+                self.reload()
+
+    def apply_message(self, data):
+        """
+        Применение опубликованных изменений расписания.
+
+        Напоминание в прошлом приходит после снятия захвата с неотправленной
+        привычки, поэтому повтор откладывается на REMINDER_SCHEDULER_RETRY_DELAY,
+        чтобы не повторять захват и отправку без паузы.
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+        if data == RELOAD_MESSAGE:
+            self.reload()
+            return
+        now = timezone.now()
+        retry_at = now + timezone.timedelta(
+            seconds=settings.REMINDER_SCHEDULER_RETRY_DELAY
+        )
+        for habit_id, when in json.loads(data):
+            when = parse_datetime(when) if when else None
+            if when is not None and when < now:
+                when = retry_at
+            self.schedule(habit_id, when)
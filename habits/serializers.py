@@ -1,17 +1,59 @@
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
 from habits.models import Habit
 
 
+class LinkedHabitField(serializers.PrimaryKeyRelatedField):
+    """
+    Связанная привычка с поиском в заранее загруженных привычках.
+
+    Если в контексте есть словарь linked_habits, привычка берется из него
+    без отдельного запроса к базе, иначе поле работает как обычно.
+    """
+
+    def to_internal_value(self, data):
+        linked_habits = self.context.get("linked_habits")
+        if linked_habits is None:
+            return super().to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if pk not in linked_habits:
+            self.fail("does_not_exist", pk_value=data)
+        return linked_habits[pk]
+
+
 class HabitSerializer(ModelSerializer):
     """
     Сериализатор для привычки.
     """
 
+    linked_habit = LinkedHabitField(
+        queryset=Habit.objects.filter(is_pleasant=True),
+        label="Связанная привычка",
+        required=False,
+        allow_null=True,
+    )
+
     class Meta:
         model = Habit
         fields = "__all__"
+        read_only_fields = ("next_reminder",)
+
+    def __init__(self, *args, **kwargs):
+        """
+        Ограничение вывода полями fields, если они переданы.
+        """
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
     def validate(self, data):
         """
@@ -71,3 +113,83 @@ class HabitSerializer(ModelSerializer):
             )
 
         return data
+
+
+def format_time(value, tz=None):
+    """
+    Время в формате ISO 8601, как в TimeField DRF.
+    """
+    return value.isoformat() if value is not None else None
+
+
+def format_datetime(value, tz=None):
+    """
+    Дата и время в зоне tz (по умолчанию текущей) в формате ISO 8601,
+    как в DateTimeField DRF.
+    """
+    if value is None:
+        return None
+    value = value.astimezone(tz or timezone.get_current_timezone()).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+class HabitRowSerializer:
+    """
+    Сериализатор списков привычек из строк values().
+
+    Отдает те же данные, что и HabitSerializer, но без создания моделей
+    и обхода полей DRF для каждой строки. Только для чтения.
+    """
+
+    # Поле ответа, колонка values() и функция форматирования.
+    fields = (
+        ("id", "id", None),
+        ("linked_habit", "linked_habit_id", None),
+        ("place", "place", None),
+        ("time", "time", format_time),
+        ("action", "action", None),
+        ("is_pleasant", "is_pleasant", None),
+        ("is_good", "is_good", None),
+        ("frequency", "frequency", None),
+        ("reward", "reward", None),
+        ("continuation_time", "continuation_time", None),
+        ("is_public", "is_public", None),
+        ("created_at", "created_at", format_datetime),
+        ("updated_at", "updated_at", format_datetime),
+        ("next_reminder", "next_reminder", format_datetime),
+        ("owner", "owner_id", None),
+    )
+    field_names = tuple(name for name, _, _ in fields)
+    columns = tuple(column for _, column, _ in fields)
+
+    def __init__(self, instance, many=False, fields=None):
+        self.instance = instance
+        self.many = many
+        if fields is not None:
+            self.fields = tuple(field for field in self.fields if field[0] in fields)
+        # Текущая зона читается один раз, а не для каждого значения.
+        self.timezone = timezone.get_current_timezone()
+
+    @classmethod
+    def get_columns(cls, fields=None):
+        """
+        Колонки values(), нужные для вывода полей fields.
+        """
+        return tuple(
+            column for name, column, _ in cls.fields if fields is None or name in fields
+        )
+
+    def to_representation(self, row):
+        tz = self.timezone
+        return {
+            name: fmt(row[column], tz) if fmt else row[column]
+            for name, column, fmt in self.fields
+        }
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(row) for row in self.instance]
+        return self.to_representation(self.instance)
@@ -0,0 +1,359 @@
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from habits.models import Habit
+from habits.signals import reminders_changed
+from habits.telegram import REJECTED, SENT, get_client
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def build_message_body(habit):
+    """
+    Описание привычки для текста напоминания.
+    """
+    lines = [f"Действие: {habit.action}", f"Место: {habit.place}"]
+    if habit.linked_habit:
+        lines.append(f"Связанная привычка: {habit.linked_habit}")
+    elif habit.reward:
+        lines.append(f"Награда: {habit.reward}")
+    lines.append(f"Время выполнения: {habit.continuation_time} секунд")
+    return "\n".join(lines)
+
+
+def build_message(habit):
+    """
+    Формирование текста напоминания о привычке.
+    """
+    return f"Напоминание!\n{build_message_body(habit)}"
+
+
+def build_digests(habits):
+    """
+    Формирование сводных сообщений по нескольким привычкам одного чата.
+
+    Сообщения разбиваются так, чтобы не превышать лимит длины телеграма.
+    """
+    header = "Напоминания!"
+    digests = []
+    text, included = header, []
+    for habit in habits:
+        body = build_message_body(habit)
+        if included and len(text) + len(body) + 2 > TELEGRAM_MESSAGE_LIMIT:
+            digests.append((text, included))
+            text, included = header, []
+        text = f"{text}\n\n{body}"
+        included.append(habit)
+    if included:
+        digests.append((text, included))
+    return digests
+
+
+def build_outgoing(chunk):
+    """
+    Сообщения на отправку: (chat_id, текст, привычки в сообщении).
+
+    Привычки пользователей с включенной сводкой объединяются в одно
+    сообщение на чат, остальным уходит по сообщению на привычку.
+    """
+    digest_habits = defaultdict(list)
+    outgoing = []
+    for habit in chunk:
+        if settings.TELEGRAM_DIGEST_WINDOW and habit.owner.tg_digest_enabled:
+            digest_habits[habit.owner.tg_chat_id].append(habit)
+        else:
+            outgoing.append((habit.owner.tg_chat_id, build_message(habit), [habit]))
+
+    for chat_id, habits in digest_habits.items():
+        if len(habits) == 1:
+            outgoing.append((chat_id, build_message(habits[0]), habits))
+            continue
+        for text, included in build_digests(habits):
+            outgoing.append((chat_id, text, included))
+    return outgoing
+
+
+def get_due_habits(check_time):
+    """
+    Привычки, у которых подошло время уведомления.
+
+    tg_chat_id у пользователя обязателен, поэтому достаточно проверить
+    owner_id без соединения с таблицей пользователей: такой фильтр целиком
+    покрывается частичным индексом habit_due_reminder_idx.
+    """
+    return Habit.objects.filter(next_reminder__lte=check_time, owner__isnull=False)
+
+
+def advance_reminder(next_reminder, frequency, check_time):
+    """
+    Ближайшее напоминание по расписанию привычки позже check_time.
+
+    Пропущенные периоды не отправляются повторно: привычка, простоявшая
+    несколько периодов, получает одно напоминание и сразу сдвигается вперед.
+    """
+    step = timezone.timedelta(days=frequency)
+    return next_reminder + step * ((check_time - next_reminder) // step + 1)
+
+
+def claim_due_habits(check_time, limit, habit_ids=None, owner_ids=None):
+    """
+    Атомарный захват пачки привычек, у которых подошло время уведомления.
+
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, и в той же
+    транзакции next_reminder сдвигается за check_time, поэтому параллельные
+    сканеры делят выборку без пересечений, а следующий тик уже не увидит
+    захваченные привычки. habit_ids и owner_ids ограничивают захват
+    заданными привычками и владельцами.
+    """
+    queryset = get_due_habits(check_time)
+    if habit_ids is not None:
+        queryset = queryset.filter(pk__in=habit_ids)
+    if owner_ids is not None:
+        queryset = queryset.filter(owner_id__in=owner_ids)
+
+    with transaction.atomic():
+        rows = list(
+            queryset.order_by("next_reminder", "pk")
+            .select_for_update(skip_locked=True, of=("self",))
+            .values_list("pk", "next_reminder", "frequency", "is_public")[:limit]
+        )
+        now = timezone.now()
+        claimed = [
+            Habit(
+                pk=pk,
+                next_reminder=advance_reminder(next_reminder, frequency, check_time),
+                updated_at=now,
+            )
+            for pk, next_reminder, frequency, _ in rows
+        ]
+        Habit.objects.bulk_update(claimed, ["next_reminder", "updated_at"])
+        reminders_changed.send(
+            sender=Habit,
+            changes=[(habit.pk, habit.next_reminder) for habit in claimed],
+            public=any(is_public for *_, is_public in rows),
+        )
+    return [habit.pk for habit in claimed]
+
+
+def claim_digest_companions(check_time, habit_ids, limit):
+    """
+    Захват привычек, которые наступят в окне сводки, у владельцев habit_ids.
+
+    Так напоминания, до которых осталось меньше TELEGRAM_DIGEST_WINDOW
+    секунд, уходят в одном сообщении с уже наступившими.
+    """
+    if not settings.TELEGRAM_DIGEST_WINDOW or not habit_ids:
+        return []
+    owner_ids = set(
+        Habit.objects.filter(pk__in=habit_ids, owner__tg_digest_enabled=True)
+        .values_list("owner_id", flat=True)
+        .distinct()
+    )
+    if not owner_ids:
+        return []
+    window_end = check_time + timezone.timedelta(
+        seconds=settings.TELEGRAM_DIGEST_WINDOW
+    )
+    return claim_due_habits(window_end, limit, owner_ids=owner_ids)
+
+
+def iter_claimed_chunks(check_time, chunk_size):
+    """
+    Последовательный захват пачек привычек до исчерпания выборки.
+    """
+    while habit_ids := claim_due_habits(check_time, chunk_size):
+        yield habit_ids + claim_digest_companions(check_time, habit_ids, chunk_size)
+
+
+def release_habits(habits):
+    """
+    Возврат захвата для неотправленных привычек.
+
+    next_reminder откатывается на один период, чтобы привычку подхватил
+    следующий тик, и только если привычку не изменили после захвата.
+    Привычки с одинаковым расписанием откатываются одним UPDATE.
+    """
+    groups = defaultdict(list)
+    for habit in habits:
+        groups[(habit.next_reminder, habit.frequency)].append(habit)
+
+    changes = []
+    public = False
+    for (next_reminder, frequency), group in groups.items():
+        previous = next_reminder - timezone.timedelta(days=frequency)
+        queryset = Habit.objects.filter(
+            pk__in=[habit.pk for habit in group], next_reminder=next_reminder
+        )
+        released = set(queryset.values_list("pk", flat=True))
+        queryset.filter(pk__in=released).update(
+            next_reminder=previous, updated_at=timezone.now()
+        )
+        changes += [(pk, previous) for pk in released]
+        public = public or any(
+            habit.is_public for habit in group if habit.pk in released
+        )
+    reminders_changed.send(sender=Habit, changes=changes, public=public)
+
+
+def release_after_failure(habits, habit_ids):
+    """
+    Снятие захвата с неотправленных привычек после ошибки рассылки.
+
+    Ошибка снятия только логируется, чтобы не скрыть исходную.
+    """
+    try:
+        release_habits([*habits, *Habit.objects.filter(pk__in=habit_ids)])
+    except Exception:
+        logger.exception(
+            "Не удалось снять захват с %s привычек", len(habits) + len(habit_ids)
+        )
+
+
+def send_chunk(client, pool, chunk):
+    """
+    Параллельная отправка пачки привычек.
+
+    Возвращает число отправленных сообщений, неотправленные привычки,
+    которые нужно повторить, и число привычек, отклоненных телеграмом.
+    """
+    outgoing = build_outgoing(chunk)
+    results = pool.map(
+        lambda message: client.send_message(message[0], message[1]), outgoing
+    )
+    messages = rejected = 0
+    undelivered = []
+    for (_, _, habits), result in zip(outgoing, results):
+        if result == SENT:
+            messages += 1
+        elif result == REJECTED:
+            rejected += len(habits)
+        else:
+            undelivered += habits
+    return messages, undelivered, rejected
+
+
+def dispatch_chunks(id_chunks, workers=None):
+    """
+    Рассылка уведомлений по пачкам идентификаторов уже захваченных привычек.
+
+    Сообщения каждой пачки отправляются параллельно через общий пул
+    соединений. Захват неотправленных привычек снимается после обработки
+    всех пачек, чтобы они не были захвачены повторно в этом же проходе.
+    Привычки, отклоненные телеграмом, остаются сдвинутыми на период,
+    иначе они отправлялись бы заново на каждом проходе.
+    """
+    workers = workers or settings.TELEGRAM_DISPATCH_WORKERS
+    queryset = Habit.objects.select_related("owner", "linked_habit__owner")
+    sent = messages = rejected = 0
+    undelivered = []
+    started = time.monotonic()
+
+    chunks = iter(id_chunks)
+    current = []
+    client = get_client()
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            for current in chunks:
+                chunk = list(queryset.filter(pk__in=current).order_by("pk"))
+                chunk_messages, failed_chunk, chunk_rejected = send_chunk(
+                    client, pool, chunk
+                )
+                messages += chunk_messages
+                sent += len(chunk) - len(failed_chunk) - chunk_rejected
+                rejected += chunk_rejected
+                undelivered += failed_chunk
+                current = []
+    except BaseException:
+        # Захваченные списком пачки уже сдвинуты; ленивые пачки из
+        # генератора еще не захвачены, и их перебор захватил бы новые.
+        pending = list(current)
+        if isinstance(id_chunks, list):
+            pending += [pk for habit_ids in chunks for pk in habit_ids]
+        release_after_failure(undelivered, pending)
+        raise
+
+    release_habits(undelivered)
+    failed = len(undelivered) + rejected
+
+    elapsed = time.monotonic() - started
+    rate = sent / elapsed if elapsed else 0.0
+    logger.info(
+        "Отправлено уведомлений: %s в %s сообщениях, ошибок: %s "
+        "(отклонено телеграмом: %s), %.2f с (%.1f в секунду)",
+        sent,
+        messages,
+        failed,
+        rejected,
+        elapsed,
+        rate,
+    )
+    return {
+        "sent": sent,
+        "messages": messages,
+        "failed": failed,
+        "rejected": rejected,
+        "elapsed": elapsed,
+        "rate": rate,
+    }
+
+
+def dispatch_claimed_habits(habit_ids, chunk_size=None, workers=None):
+    """
+    Рассылка уведомлений по уже захваченным привычкам.
+    """
+    chunk_size = chunk_size or settings.TELEGRAM_DISPATCH_CHUNK_SIZE
+    return dispatch_chunks(split_into_batches(habit_ids, chunk_size), workers)
+
+
+def get_check_time():
+    """
+    Граница выборки: уведомления, которые наступят в ближайшую минуту.
+    """
+    return timezone.now() + timezone.timedelta(minutes=1)
+
+
+def dispatch_due_habits(check_time=None, chunk_size=None, workers=None):
+    """
+    Захват и рассылка уведомлений по всем привычкам, у которых подошло время.
+    """
+    check_time = check_time or get_check_time()
+    chunk_size = chunk_size or settings.TELEGRAM_DISPATCH_CHUNK_SIZE
+    return dispatch_chunks(iter_claimed_chunks(check_time, chunk_size), workers)
+
+
+def split_into_batches(ids, batch_size):
+    """
+    Разбиение списка идентификаторов на пачки фиксированного размера.
+    """
+    batches = []
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        batches.append(ids[start:end])
+    return batches
+
+
+def summarize_shards(results):
+    """
+    Сводка по результатам шардов рассылки.
+    """
+    summary = {
+        "shards": len(results),
+        "sent": sum(result["sent"] for result in results),
+        "messages": sum(result["messages"] for result in results),
+        "failed": sum(result["failed"] for result in results),
+        "rejected": sum(result["rejected"] for result in results),
+        "elapsed": max((result["elapsed"] for result in results), default=0.0),
+        "per_shard": sorted(results, key=lambda result: result["shard"]),
+    }
+    summary["rate"] = (
+        summary["sent"] / summary["elapsed"] if summary["elapsed"] else 0.0
+    )
+    return summary
@@ -0,0 +1,108 @@
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from habits.cache import public_feed
+from habits.models import Habit
+
+logger = logging.getLogger(__name__)
+
+# Изменение next_reminder в обход Habit.save (захват и откат рассылки).
+# Аргумент changes - список пар (id привычки, новое next_reminder),
+# public - есть ли среди них публичные привычки.
+reminders_changed = Signal()
+
+RELOAD_MESSAGE = "reload"
+
+_redis = None
+
+
+def get_redis():
+    """
+    Общий клиент редиса процесса: канал планировщика, ограничитель частоты.
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def publish_reminders(changes):
+    """
+    Публикация изменений расписания для планировщика напоминаний.
+    """
+    publish_raw(
+        json.dumps([[pk, when.isoformat() if when else None] for pk, when in changes])
+    )
+
+
+def publish_raw(payload):
+    """
+    Отправка сообщения в канал планировщика.
+    """
+    try:
+        get_redis().publish(settings.REMINDER_SCHEDULER_CHANNEL, payload)
+    except redis.RedisError as exc:
+        logger.warning("Не удалось опубликовать изменения расписания: %s", exc)
+
+
+def publish_reload():
+    """
+    Запрос полной перезагрузки расписания после массовых изменений.
+    """
+    if settings.REMINDER_SCHEDULER_ENABLED:
+        transaction.on_commit(lambda: publish_raw(RELOAD_MESSAGE))
+
+
+def schedule_publish(changes):
+    """
+    Публикация изменений после фиксации транзакции.
+    """
+    if settings.REMINDER_SCHEDULER_ENABLED and changes:
+        transaction.on_commit(lambda: publish_reminders(changes))
+
+
+@receiver(post_save, sender=Habit)
+def habit_saved(sender, instance, **kwargs):
+    schedule_publish([(instance.pk, instance.next_reminder)])
+
+
+@receiver(post_delete, sender=Habit)
+def habit_deleted(sender, instance, **kwargs):
+    schedule_publish([(instance.pk, None)])
+
+
+@receiver(reminders_changed)
+def habit_reminders_changed(sender, changes, **kwargs):
+    schedule_publish(changes)
+
+
+def invalidate_public_feed():
+    """
+    Сброс кэша публичной ленты после фиксации транзакции.
+    """
+    transaction.on_commit(public_feed.bump)
+
+
+@receiver(post_save, sender=Habit)
+def public_habit_saved(sender, instance, created, **kwargs):
+    loaded_values = getattr(instance, "_loaded_values", None) or {}
+    if instance.is_public or (not created and loaded_values.get("is_public", True)):
+        invalidate_public_feed()
+
+
+@receiver(post_delete, sender=Habit)
+def public_habit_deleted(sender, instance, **kwargs):
+    if instance.is_public:
+        invalidate_public_feed()
+
+
+@receiver(reminders_changed)
+def public_reminders_changed(sender, changes, public=False, **kwargs):
+    if changes and public:
+        invalidate_public_feed()
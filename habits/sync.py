@@ -0,0 +1,131 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from habits.models import Habit, HabitTombstone
+
+
+def encode_sync_token(habits_cursor, tombstones_cursor):
+    """
+    Непрозрачный токен продолжения из позиций (время, id) двух потоков.
+    """
+    payload = [
+        [when.isoformat(), pk] if when else None
+        for when, pk in (habits_cursor, tombstones_cursor)
+    ]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_sync_token(token):
+    """
+    Разбор токена продолжения в позиции потоков изменений и удалений.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if not isinstance(payload, list) or len(payload) != 2:
+            raise ValueError
+        return tuple(decode_cursor(cursor) for cursor in payload)
+    except (ValueError, TypeError):
+        raise ValidationError({"since": "Некорректный токен синхронизации."})
+
+
+def decode_cursor(cursor):
+    """
+    Позиция (время, id) из пары токена или начальная позиция для null.
+    """
+    if cursor is None:
+        return None, 0
+    if not isinstance(cursor, list) or len(cursor) != 2:
+        raise ValueError
+    when = parse_datetime(cursor[0])
+    if when is None:
+        raise ValueError
+    return when, int(cursor[1])
+
+
+def after(queryset, field, cursor):
+    """
+    Строки после позиции (время, id) в порядке (field, id).
+    """
+    when, pk = cursor
+    if when is not None:
+        queryset = queryset.filter(
+            Q(**{f"{field}__gt": when}) | Q(**{field: when, "pk__gt": pk})
+        )
+    return queryset.order_by(field, "pk")
+
+
+def get_changes(owner_id, token, limit):
+    """
+    Изменения привычек владельца после позиции токена.
+
+    Без токена возвращаются все привычки, а поток удалений начинается
+    с последней отметки. Каждый поток читается по индексу
+    (owner, время, id) не дальше limit строк.
+    """
+    if token:
+        habits_cursor, tombstones_cursor = decode_sync_token(token)
+        tombstones = list(
+            after(
+                HabitTombstone.objects.filter(owner_id=owner_id),
+                "deleted_at",
+                tombstones_cursor,
+            ).values_list("pk", "habit_id", "deleted_at")[: limit + 1]
+        )
+    else:
+        habits_cursor = (None, 0)
+        last = (
+            HabitTombstone.objects.filter(owner_id=owner_id)
+            .order_by("-deleted_at", "-pk")
+            .values_list("deleted_at", "pk")
+            .first()
+        )
+        tombstones_cursor = last or (None, 0)
+        tombstones = []
+
+    habits = list(
+        after(Habit.objects.filter(owner_id=owner_id), "updated_at", habits_cursor)[
+            : limit + 1
+        ]
+    )
+
+    has_more = len(habits) > limit or len(tombstones) > limit
+    habits, tombstones = habits[:limit], tombstones[:limit]
+    if habits:
+        habits_cursor = (habits[-1].updated_at, habits[-1].pk)
+    if tombstones:
+        tombstones_cursor = (tombstones[-1][2], tombstones[-1][0])
+
+    return {
+        "habits": habits,
+        "deleted": [habit_id for _, habit_id, _ in tombstones],
+        "next": encode_sync_token(habits_cursor, tombstones_cursor),
+        "has_more": has_more,
+    }
+
+
+def touch_dependents(habits):
+    """
+    Обновление updated_at у привычек, связанных с удаляемыми.
+
+    Удаление обнуляет linked_habit каскадным UPDATE без updated_at, и без
+    этого синхронизация и валидаторы списка не увидят изменения.
+    """
+    Habit.objects.filter(linked_habit__in=[habit.pk for habit in habits]).update(
+        updated_at=timezone.now()
+    )
+
+
+def create_tombstones(habits):
+    """
+    Отметки об удалении привычек, у которых есть владелец.
+    """
+    HabitTombstone.objects.bulk_create(
+        HabitTombstone(habit_id=habit.pk, owner_id=habit.owner_id)
+        for habit in habits
+        if habit.owner_id is not None
+    )
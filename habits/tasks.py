@@ -1,12 +1,17 @@
-from datetime import timedelta
+import logging
 
-import requests
-from celery import shared_task
+from celery import chord, shared_task
+from django.conf import settings
 from django.utils import timezone
 from rest_framework.generics import get_object_or_404
 
-from config.settings import TELEGRAM_BOT_TOKEN
 from habits.models import Habit
+from habits.services import (build_message, dispatch_claimed_habits,
+                             get_check_time, iter_claimed_chunks,
+                             release_after_failure, summarize_shards)
+from habits.telegram import RETRY, get_client
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -14,52 +19,64 @@ def send_tg_notification(habit_id):
     """
     Задача на отправку одного уведомления.
     """
-    habit = get_object_or_404(Habit, pk=habit_id)
-    message = ""
-    if habit.linked_habit:
-        message = (
-            f"Напоминание!\n"
-            f"Действие: {habit.action}\n"
-            f"Место: {habit.place}\n"
-            f"Связанная привычка: {habit.linked_habit}\n"
-            f"Время выполнения: {habit.continuation_time} секунд"
-        )
-    elif habit.reward:
-        message = (
-            f"Напоминание!\n"
-            f"Действие: {habit.action}\n"
-            f"Место: {habit.place}\n"
-            f"Награда: {habit.reward}\n"
-            f"Время выполнения: {habit.continuation_time} секунд"
-        )
-    else:
-        message = (
-            f"Напоминание!\n"
-            f"Действие: {habit.action}\n"
-            f"Место: {habit.place}\n"
-            f"Время выполнения: {habit.continuation_time} секунд"
-        )
-
-    url = (
-        f"https://api.telegram.org/"
-        f"bot{TELEGRAM_BOT_TOKEN}/"
-        f"sendMessage?chat_id={habit.owner.tg_chat_id}&text={message}"
+    habit = get_object_or_404(
+        Habit.objects.select_related("owner", "linked_habit__owner"), pk=habit_id
     )
-    requests.get(url=url)
+    result = get_client().send_message(habit.owner.tg_chat_id, build_message(habit))
+    if result == RETRY:
+        return
     habit.next_reminder = habit.next_reminder + timezone.timedelta(days=habit.frequency)
-    habit.save(update_fields=["next_reminder"])
+    habit.save(update_fields=["next_reminder", "updated_at"])
+
+
+@shared_task
+def send_tg_notifications_batch(shard, habit_ids):
+    """
+    Задача на отправку уведомлений по одной пачке захваченных привычек.
+    """
+    result = dispatch_claimed_habits(habit_ids)
+    result["shard"] = shard
+    return result
+
+
+@shared_task
+def collect_tg_notifications_summary(results):
+    """
+    Задача на сбор сводки по всем пачкам рассылки.
+    """
+    summary = summarize_shards(results)
+    for result in summary["per_shard"]:
+        logger.info(
+            "Шард %s: отправлено %s, ошибок %s, %.2f с",
+            result["shard"],
+            result["sent"],
+            result["failed"],
+            result["elapsed"],
+        )
+    return summary
 
 
 @shared_task
 def check_and_send_tg_notifications():
     """
     Задача на проверку привычек, у которых подошло время уведомления.
+
+    Привычки атомарно захватываются пачками, каждая пачка отправляется
+    отдельной задачей, поэтому рассылка масштабируется числом воркеров,
+    а пересекающиеся тики не отправляют одно уведомление дважды.
     """
-    check_time = timezone.now() + timedelta(minutes=1)
-    habits_to_notify = Habit.objects.filter(
-        next_reminder__lte=check_time, owner__tg_chat_id__isnull=False
+    batches = list(
+        iter_claimed_chunks(get_check_time(), settings.TELEGRAM_DISPATCH_BATCH_SIZE)
     )
-    print(habits_to_notify)
+    if not batches:
+        return {"shards": 0, "habits": 0}
 
-    for habit in habits_to_notify:
-        send_tg_notification(habit.pk)
+    try:
+        chord(
+            send_tg_notifications_batch.s(shard, batch)
+            for shard, batch in enumerate(batches)
+        )(collect_tg_notifications_summary.s())
+    except Exception:
+        release_after_failure([], [pk for batch in batches for pk in batch])
+        raise
+    return {"shards": len(batches), "habits": sum(map(len, batches))}
@@ -0,0 +1,227 @@
+import logging
+import os
+import threading
+import time
+
+import redis
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+from habits.signals import get_redis
+
+logger = logging.getLogger(__name__)
+
+SENT = "sent"
+RETRY = "retry"
+REJECTED = "rejected"
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов: не более rate запросов в секунду.
+
+    rate=0 отключает ограничение.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Ожидание свободного токена.
+        """
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+
+
+class RedisTokenBucket:
+    """
+    Общий для всех процессов ограничитель частоты на ключе редиса.
+
+    Запас токенов и время пополнения хранятся в хэше и обновляются
+    атомарно скриптом по часам редиса, поэтому лимит rate действует на
+    все воркеры вместе. Пока редис недоступен, работает ограничитель
+    процесса.
+    """
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local capacity = tonumber(ARGV[2])
+    local time = redis.call("TIME")
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local state = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    local delay = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        delay = (1 - tokens) / rate
+    end
+    redis.call("HSET", KEYS[1], "tokens", tokens, "updated_at", now)
+    redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(delay)
+    """
+
+    def __init__(self, rate, capacity=None, key=None, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.key = key or settings.TELEGRAM_RATE_LIMIT_KEY
+        self.sleep = sleep
+        self.fallback = TokenBucket(rate, capacity, sleep=sleep)
+        self.script = None
+        self.redis_failed = False
+
+    def take(self):
+        """
+        Попытка взять токен: 0 при успехе, иначе время ожидания.
+        """
+        if self.script is None:
+            self.script = get_redis().register_script(self.SCRIPT)
+        return float(self.script(keys=[self.key], args=[self.rate, self.capacity]))
+
+    def acquire(self):
+        """
+        Ожидание свободного токена.
+        """
+        if not self.rate:
+            return
+        while True:
+            try:
+                delay = self.take()
+            except redis.RedisError as exc:
+                if not self.redis_failed:
+                    logger.warning("Ограничитель частоты без редиса: %s", exc)
+                    self.redis_failed = True
+                self.fallback.acquire()
+                return
+            self.redis_failed = False
+            if not delay:
+                return
+            self.sleep(delay)
+
+
+class TelegramClient:
+    """
+    Клиент Bot API с пулом keep-alive соединений, повторами и лимитом частоты.
+    """
+
+    def __init__(self, pool_size=None, rate_limiter=None, sleep=time.sleep):
+        pool_size = pool_size or settings.TELEGRAM_DISPATCH_WORKERS
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.sleep = sleep
+
+    def get_retry_delay(self, attempt, response=None):
+        """
+        Пауза перед повтором: retry_after из ответа 429 или экспонента.
+        """
+        if response is not None and response.status_code == 429:
+            try:
+                return float(response.json()["parameters"]["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        return settings.TELEGRAM_RETRY_BACKOFF * 2**attempt
+
+    def send_message(self, chat_id, text):
+        """
+        Отправка сообщения. Возвращает SENT, RETRY или REJECTED.
+
+        Повторяются сетевые ошибки, ответы 429 и 5xx, и если повторы
+        исчерпаны, возвращается RETRY. Прочие ошибки телеграма (например,
+        несуществующий чат или заблокированный бот) постоянны: они не
+        повторяются и возвращают REJECTED.
+        """
+        url = (
+            f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/sendMessage"
+        )
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            response = None
+            try:
+                response = self.session.post(
+                    url,
+                    json={"chat_id": chat_id, "text": text},
+                    timeout=settings.TELEGRAM_REQUEST_TIMEOUT,
+                )
+            except requests.RequestException as exc:
+                logger.warning(
+                    "Ошибка запроса к телеграму для чата %s: %s", chat_id, exc
+                )
+            else:
+                if response.ok:
+                    return SENT
+                if response.status_code != 429 and response.status_code < 500:
+                    logger.warning(
+                        "Телеграм вернул %s для чата %s", response.status_code, chat_id
+                    )
+                    return REJECTED
+            if attempt < settings.TELEGRAM_MAX_RETRIES:
+                self.sleep(self.get_retry_delay(attempt, response))
+
+        logger.warning("Не удалось отправить сообщение в чат %s", chat_id)
+        return RETRY
+
+    def close(self):
+        self.session.close()
+
+
+def get_rate_limiter():
+    """
+    Ограничитель частоты: общий через редис, а без него - на процесс.
+    """
+    if settings.REDIS_URL:
+        return RedisTokenBucket(settings.TELEGRAM_RATE_LIMIT)
+    return TokenBucket(settings.TELEGRAM_RATE_LIMIT)
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Клиент телеграма, общий для всех потоков процесса.
+
+    После fork воркера celery создается новый клиент, чтобы процессы
+    не делили сокеты пула соединений.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = TelegramClient()
+            _client_pid = os.getpid()
+        return _client
+
+
+@receiver(setting_changed)
+def reset_client(setting, **kwargs):
+    global _client
+    if setting.startswith("TELEGRAM_"):
+        _client = None
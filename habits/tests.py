@@ -1,20 +1,104 @@
+import base64
 import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_celery_beat.models import IntervalSchedule, PeriodicTask
 from freezegun import freeze_time
 from rest_framework import status
 from rest_framework.reverse import reverse_lazy
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-from habits.models import Habit
+from config.celery import configure_db_connections
+from config.routers import (ReplicaRouter, choose_replica,
+                            is_pinned_to_primary, replica_reads)
+from habits.cache import CacheNamespace, public_feed
+from habits.models import Habit, HabitTombstone, calculate_next_reminder
+from habits.scheduler import ReminderScheduler, disable_polling_task
+from habits.serializers import HabitRowSerializer, HabitSerializer
+from habits.services import (build_digests, claim_due_habits,
+                             dispatch_claimed_habits, dispatch_due_habits)
+from habits.tasks import (check_and_send_tg_notifications,
+                          collect_tg_notifications_summary,
+                          send_tg_notification, send_tg_notifications_batch)
+from habits.telegram import (REJECTED, SENT, RedisTokenBucket, TelegramClient,
+                             TokenBucket)
+from users.authentication import TokenUser, get_cached_user
 from users.models import User
 
 
+class FakeTelegramServer:
+    """
+    Локальный HTTP-сервер, имитирующий Bot API телеграма.
+
+    responses - ответы (статус, тело) на первые запросы, дальше status_code.
+    """
+
+    def __init__(self, status_code=200, responses=()):
+        self.status_code = status_code
+        self.responses = list(responses)
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                with server.lock:
+                    server.messages.append(json.loads(self.rfile.read(length)))
+                    if server.responses:
+                        status_code, payload = server.responses.pop(0)
+                    else:
+                        status_code = server.status_code
+                        payload = {"ok": status_code == 200}
+                body = json.dumps(payload).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
 @freeze_time("2025-10-24 12:00:00+07:00")
 class HabitTestCase(APITestCase):
 
     def setUp(self):
         """Наполнение базы данных."""
         super().setUp()
+        cache.clear()
         self.user = User.objects.create(email="aboba@example.com")
         self.superuser = User.objects.create(
             email="superuser@example.com", is_superuser=True
@@ -217,7 +301,7 @@ class HabitTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("Частота не может быть меньше 1 дня", str(response.json()))
 
-    def test_habit_delete_403(self):
+    def test_habit_delete_404(self):
         """Тест доступа на удаление."""
         other_user = User.objects.create(email="other@example.com")
         other_habit = Habit.objects.create(
@@ -235,7 +319,8 @@ class HabitTestCase(APITestCase):
 
         url = reverse_lazy("habits:habit_delete", args=(other_habit.pk,))
         response = self.client.delete(url)
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Habit.objects.filter(pk=other_habit.pk).exists())
 
     def test_habit_retrieve(self):
         """Тест получения одной привычки."""
@@ -260,7 +345,7 @@ class HabitTestCase(APITestCase):
         self.assertEqual(result["owner"], self.user.pk)
         self.assertEqual(result["linked_habit"], None)
 
-    def test_habit_retrieve_403(self):
+    def test_habit_retrieve_404(self):
         """Тест на доступ только к своим привычкам."""
         other_user = User.objects.create(email="other@example.com")
         other_habit = Habit.objects.create(
@@ -278,7 +363,52 @@ class HabitTestCase(APITestCase):
 
         url = reverse_lazy("habits:habit_retrieve", args=(other_habit.pk,))
         response = self.client.get(url)
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_habit_detail_query_count(self):
+        """Тест одной выборки привычки без загрузки владельца."""
+        pleasant_habit = Habit.objects.create(
+            owner=self.user,
+            place="Дома",
+            time=datetime.time(hour=20),
+            action="Принять ванну",
+            is_pleasant=True,
+            is_good=False,
+            frequency=1,
+            continuation_time=60,
+            is_public=False,
+        )
+        Habit.objects.filter(pk=self.habit.pk).update(
+            linked_habit=pleasant_habit, reward=None
+        )
+        retrieve_url = reverse_lazy("habits:habit_retrieve", args=(self.habit.pk,))
+        update_url = reverse_lazy("habits:habit_update", args=(self.habit.pk,))
+        delete_url = reverse_lazy("habits:habit_delete", args=(self.habit.pk,))
+
+        with self.assertNumQueries(1):
+            self.client.get(retrieve_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(update_url, {"action": "Выпить чаю"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.count_selects(queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(delete_url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.count_selects(queries), 1)
+
+    def count_selects(self, queries):
+        """Число выборок привычек и пользователей среди запросов."""
+        tables = ('FROM "habits_habit"', 'FROM "users_user"')
+        selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        return sum(any(table in sql for table in tables) for sql in selects)
 
     def test_habit_list(self):
         """Тест на вывод своих привычек."""
@@ -287,7 +417,7 @@ class HabitTestCase(APITestCase):
         result = response.json()
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(result["count"], 2)
+        self.assertNotIn("count", result)
         self.assertEqual(result["next"], None)
         self.assertEqual(result["previous"], None)
         self.assertEqual(len(result["results"]), 2)
@@ -299,7 +429,7 @@ class HabitTestCase(APITestCase):
         result = response.json()
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(result["count"], 1)
+        self.assertEqual(len(result["results"]), 1)
         self.assertEqual(result["results"][0]["id"], self.public_habit.pk)
         self.assertEqual(result["results"][0]["is_public"], True)
 
@@ -311,10 +441,1508 @@ class HabitTestCase(APITestCase):
         result = response.json()
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(result["count"], 3)
         self.assertEqual(len(result["results"]), 3)
 
         habit_ids = [item["id"] for item in result["results"]]
         self.assertIn(self.habit.pk, habit_ids)
         self.assertIn(self.public_habit.pk, habit_ids)
         self.assertIn(self.private_habit.pk, habit_ids)
+
+    def test_habit_public_list_cache(self):
+        """Тест кэширования публичной ленты и ее инвалидации."""
+        url = reverse_lazy("habits:public_habits_list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["results"][0]["action"], "Выпить стакан водки")
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(
+            public_feed.get_stats(), {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public_habit.action = "Выпить стакан сока"
+            self.public_habit.save()
+        response = self.client.get(url)
+        self.assertEqual(response.json()["results"][0]["action"], "Выпить стакан сока")
+        self.assertEqual(
+            public_feed.get_stats(), {"hits": 1, "misses": 2, "hit_ratio": 1 / 3}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.habit.action = "Выпить два стакана воды"
+            self.habit.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.private_habit.is_public = True
+            self.private_habit.save()
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()["results"]), 3)
+        self.assertEqual(
+            public_feed.get_stats(), {"hits": 1, "misses": 3, "hit_ratio": 0.25}
+        )
+
+    def test_public_feed_claim_invalidation(self):
+        """Тест сброса публичной ленты только при захвате публичных привычек."""
+        check_time = timezone.now() + datetime.timedelta(days=7)
+        version = public_feed.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_due_habits(check_time, 10, habit_ids=[self.habit.pk])
+        self.assertEqual(public_feed.get_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_due_habits(check_time, 10, habit_ids=[self.public_habit.pk])
+        self.assertNotEqual(public_feed.get_version(), version)
+
+    def test_habit_list_conditional_get(self):
+        """Тест ответа 304 для списка привычек без изменений."""
+        url = reverse_lazy("habits:habits_list")
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+        self.assertIn("Last-Modified", response.headers)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(len(queries), 1)
+        sql = queries.captured_queries[0]["sql"].upper()
+        self.assertIn("LIMIT", sql)
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("MAX(", sql)
+
+        response = self.client.get(url, {"page_size": 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.private_habit.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_habit_public_list_conditional_get(self):
+        """Тест ответа 304 для публичной ленты."""
+        url = reverse_lazy("habits:public_habits_list")
+        etag = self.client.get(url).headers["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.public_habit.action = "Выпить стакан сока"
+            self.public_habit.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_habit_retrieve_conditional_get(self):
+        """Тест ответа 304 для привычки по ETag и If-Modified-Since."""
+        url = reverse_lazy("habits:habit_retrieve", args=(self.habit.pk,))
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with freeze_time("2025-10-24 12:01:00+07:00"):
+            self.habit.action = "Выпить два стакана воды"
+            self.habit.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["action"], "Выпить два стакана воды")
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_habit_sync(self):
+        """Тест дельта-синхронизации привычек по токену."""
+        url = reverse_lazy("habits:habits_sync")
+        result = self.client.get(url).json()
+        self.assertEqual(
+            {item["id"] for item in result["habits"]},
+            {self.habit.pk, self.private_habit.pk},
+        )
+        self.assertEqual(result["deleted"], [])
+        self.assertFalse(result["has_more"])
+
+        result = self.client.get(url, {"since": result["next"]}).json()
+        self.assertEqual(result["habits"], [])
+        self.assertEqual(result["deleted"], [])
+        token = result["next"]
+
+        with freeze_time("2025-10-24 12:01:00+07:00"):
+            self.habit.action = "Выпить два стакана воды"
+            self.habit.save()
+            response = self.client.delete(
+                reverse_lazy("habits:habit_delete", args=(self.private_habit.pk,))
+            )
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        with self.assertNumQueries(2):
+            result = self.client.get(url, {"since": token}).json()
+        self.assertEqual([item["id"] for item in result["habits"]], [self.habit.pk])
+        self.assertEqual(result["habits"][0]["action"], "Выпить два стакана воды")
+        self.assertEqual(result["deleted"], [self.private_habit.pk])
+
+        result = self.client.get(url, {"since": result["next"]}).json()
+        self.assertEqual((result["habits"], result["deleted"]), ([], []))
+
+    def test_habit_sync_linked_delete(self):
+        """Привычки, связанные с удаленной, попадают в синхронизацию."""
+        url = reverse_lazy("habits:habits_sync")
+        pleasant_habits = Habit.objects.bulk_create(
+            Habit(
+                owner=self.user,
+                place="Дома",
+                time=datetime.time(hour=20),
+                action="Принять ванну",
+                is_pleasant=True,
+                is_good=False,
+                frequency=1,
+                continuation_time=60,
+                is_public=False,
+            )
+            for _ in range(2)
+        )
+        Habit.objects.filter(pk=self.habit.pk).update(linked_habit=pleasant_habits[0])
+        Habit.objects.filter(pk=self.private_habit.pk).update(
+            linked_habit=pleasant_habits[1]
+        )
+        token = self.client.get(url).json()["next"]
+
+        with freeze_time("2025-10-24 12:01:00+07:00"):
+            response = self.client.delete(
+                reverse_lazy("habits:habit_delete", args=(pleasant_habits[0].pk,))
+            )
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        result = self.client.get(url, {"since": token}).json()
+        self.assertEqual([item["id"] for item in result["habits"]], [self.habit.pk])
+        self.assertIsNone(result["habits"][0]["linked_habit"])
+
+        with freeze_time("2025-10-24 12:02:00+07:00"):
+            response = self.client.delete(
+                reverse_lazy("habits:habits_bulk"),
+                [pleasant_habits[1].pk],
+                format="json",
+            )
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        result = self.client.get(url, {"since": result["next"]}).json()
+        self.assertEqual(
+            [item["id"] for item in result["habits"]], [self.private_habit.pk]
+        )
+
+    def test_habit_sync_limit(self):
+        """Тест постраничной синхронизации и некорректного токена."""
+        url = reverse_lazy("habits:habits_sync")
+        result = self.client.get(url, {"limit": 1}).json()
+        self.assertEqual(len(result["habits"]), 1)
+        self.assertTrue(result["has_more"])
+        first = result["habits"][0]["id"]
+
+        result = self.client.get(url, {"since": result["next"], "limit": 1}).json()
+        self.assertEqual(len(result["habits"]), 1)
+        self.assertNotEqual(result["habits"][0]["id"], first)
+
+        for payload in ("не токен", [None], [None, None, None], [[1], None], {}):
+            token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            response = self.client.get(url, {"since": token})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {"since": "не токен"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_habit_bulk_create(self):
+        """Тест пакетного создания привычек."""
+        pleasant_habit = Habit.objects.create(
+            owner=self.user,
+            place="Дома",
+            time=datetime.time(hour=20),
+            action="Принять ванну",
+            is_pleasant=True,
+            is_good=False,
+            frequency=1,
+            continuation_time=60,
+            is_public=False,
+        )
+        items = [
+            {
+                "place": "Дома",
+                "time": "17:35:00",
+                "action": f"Действие {i}",
+                "is_pleasant": False,
+                "is_good": True,
+                "frequency": 1,
+                "linked_habit": pleasant_habit.pk,
+                "continuation_time": 15,
+                "is_public": False,
+            }
+            for i in range(50)
+        ]
+        url = reverse_lazy("habits:habits_bulk")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, items, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()), 50)
+        self.assertLessEqual(len(queries), 5)
+        habit = Habit.objects.get(pk=response.json()[0]["id"])
+        self.assertEqual(habit.owner, self.user)
+        self.assertEqual(habit.linked_habit, pleasant_habit)
+        self.assertEqual(habit.next_reminder, habit.calculate_next_reminder())
+
+    def test_habit_bulk_create_errors(self):
+        """Тест ошибок по элементам пакета без частичного сохранения."""
+        item = {
+            "action": "Пробежать километр",
+            "is_pleasant": False,
+            "is_good": True,
+            "frequency": 1,
+            "continuation_time": 15,
+            "is_public": False,
+        }
+        initial_count = Habit.objects.count()
+        response = self.client.post(
+            reverse_lazy("habits:habits_bulk"),
+            [item, {**item, "frequency": 10}, {**item, "linked_habit": 0}],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertIn("non_field_errors", errors[1])
+        self.assertIn("linked_habit", errors[2])
+        self.assertEqual(Habit.objects.count(), initial_count)
+
+    def test_habit_bulk_update(self):
+        """Тест пакетного обновления привычек."""
+        url = reverse_lazy("habits:habits_bulk")
+        response = self.client.patch(
+            url,
+            [
+                {"id": self.habit.pk, "time": "19:00:00"},
+                {"id": self.private_habit.pk, "action": "Пробежать два километра"},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.habit.refresh_from_db()
+        self.private_habit.refresh_from_db()
+        self.assertEqual(self.habit.time, datetime.time(hour=19))
+        self.assertEqual(self.habit.next_reminder, self.habit.calculate_next_reminder())
+        self.assertEqual(self.private_habit.action, "Пробежать два километра")
+
+        response = self.client.patch(
+            url,
+            [
+                {"id": self.habit.pk, "action": "Выпить чаю"},
+                {"id": self.public_habit.pk, "action": "Чужая привычка"},
+            ],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn("id", response.json()[1])
+        self.habit.refresh_from_db()
+        self.assertEqual(self.habit.action, "Выпить стакан воды")
+
+    def test_habit_bulk_delete(self):
+        """Тест пакетного удаления привычек с отметками для синхронизации."""
+        url = reverse_lazy("habits:habits_bulk")
+        response = self.client.delete(
+            url, [self.habit.pk, self.public_habit.pk], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Habit.objects.filter(pk=self.habit.pk).exists())
+
+        response = self.client.delete(
+            url, [self.habit.pk, self.private_habit.pk], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Habit.objects.filter(owner=self.user).exists())
+        self.assertEqual(
+            set(
+                HabitTombstone.objects.filter(owner=self.user).values_list(
+                    "habit_id", flat=True
+                )
+            ),
+            {self.habit.pk, self.private_habit.pk},
+        )
+
+    def test_habit_row_serializer(self):
+        """Тест совпадения быстрого сериализатора списков с HabitSerializer."""
+        pleasant_habit = Habit.objects.create(
+            owner=self.user,
+            place="Дома",
+            time=datetime.time(hour=20, minute=30),
+            action="Принять ванну",
+            is_pleasant=True,
+            is_good=False,
+            frequency=1,
+            continuation_time=60,
+            is_public=False,
+        )
+        self.habit.linked_habit = pleasant_habit
+        self.habit.reward = None
+        self.habit.save()
+        Habit.objects.filter(pk=self.private_habit.pk).update(next_reminder=None)
+
+        queryset = Habit.objects.order_by("pk")
+        self.assertEqual(
+            HabitRowSerializer(
+                queryset.values(*HabitRowSerializer.columns), many=True
+            ).data,
+            [dict(item) for item in HabitSerializer(queryset, many=True).data],
+        )
+
+    def test_habit_list_sparse_fields(self):
+        """Тест выбора полей списка параметром fields."""
+        url = reverse_lazy("habits:habits_list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "id,time", "page_size": 1})
+        result = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(result["results"][0]), {"id", "time"})
+        self.assertNotIn('"action"', queries.captured_queries[-1]["sql"])
+
+        result = self.client.get(result["next"]).json()
+        self.assertEqual(set(result["results"][0]), {"id", "time"})
+
+        for fields in ("id,password", ",", " , "):
+            response = self.client.get(url, {"fields": fields})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("fields", response.json())
+
+    def test_habit_retrieve_sparse_fields(self):
+        """Тест выбора полей привычки параметром fields."""
+        url = reverse_lazy("habits:habit_retrieve", args=(self.habit.pk,))
+        etag = self.client.get(url).headers["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "action"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"action": "Выпить стакан воды"})
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertNotIn('"reward"', queries.captured_queries[0]["sql"])
+
+    def test_habit_export_ndjson(self):
+        """Тест потоковой выгрузки привычек в NDJSON."""
+        url = reverse_lazy("habits:habits_export")
+        response = self.client.get(url, HTTP_ACCEPT="application/x-ndjson")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response.headers["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            rows,
+            HabitRowSerializer(
+                Habit.objects.filter(owner=self.user)
+                .order_by("pk")
+                .values(*HabitRowSerializer.columns),
+                many=True,
+            ).data,
+        )
+
+        self.client.force_authenticate(user=self.superuser)
+        response = self.client.get(url, {"fields": "id"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [
+                {"id": pk}
+                for pk in Habit.objects.order_by("pk").values_list("pk", flat=True)
+            ],
+        )
+
+    def test_habit_export_csv(self):
+        """Тест потоковой выгрузки привычек в CSV."""
+        url = reverse_lazy("habits:habits_export")
+        response = self.client.get(url, {"type": "csv", "fields": "id,action,time"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("habits.csv", response.headers["Content-Disposition"])
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(
+            content.splitlines(),
+            [
+                "id,time,action",
+                f"{self.habit.pk},12:00:00,Выпить стакан воды",
+                f"{self.private_habit.pk},12:00:00,Пробежать километр",
+            ],
+        )
+
+        response = self.client.get(url, {"type": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_habit_list_cursor_pagination(self):
+        """Тест постраничного обхода списка привычек по курсору."""
+        for i in range(5):
+            Habit.objects.create(
+                owner=self.user,
+                place="Дом",
+                time=datetime.time(hour=9),
+                action=f"Действие {i}",
+                is_pleasant=False,
+                is_good=True,
+                frequency=1,
+                reward="Награда",
+                continuation_time=60,
+                is_public=False,
+            )
+        expected = list(
+            Habit.objects.filter(owner=self.user)
+            .order_by("-created_at", "-id")
+            .values_list("pk", flat=True)
+        )
+
+        url = f"{reverse_lazy('habits:habits_list')}?page_size=3"
+        habit_ids = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                result = self.client.get(url).json()
+                self.assertLessEqual(len(result["results"]), 3)
+                habit_ids += [item["id"] for item in result["results"]]
+                url = result["next"]
+
+        self.assertEqual(habit_ids, expected)
+        self.assertFalse(
+            any(
+                "COUNT(*)" in query["sql"].upper() for query in queries.captured_queries
+            )
+        )
+
+        response = self.client.get(
+            reverse_lazy("habits:habits_list"), {"page_size": 1000}
+        )
+        self.assertEqual(len(response.json()["results"]), len(expected))
+
+    def test_recalculate_next_reminders(self):
+        """Массовый пересчет совпадает с пересчетом каждой строки."""
+        Habit.objects.bulk_create(
+            Habit(
+                owner=self.user,
+                time=datetime.time(hour=minute // 60, minute=minute % 60),
+                is_pleasant=True,
+                is_good=False,
+                frequency=minute % 7 + 1,
+                continuation_time=5,
+                is_public=False,
+            )
+            for minute in range(0, 24 * 60, 23)
+        )
+        Habit.objects.update(next_reminder=None)
+        with self.assertNumQueries(1):
+            updated = Habit.objects.recalculate_next_reminders()
+
+        self.assertEqual(updated, Habit.objects.count())
+        for habit in Habit.objects.all():
+            self.assertEqual(
+                habit.next_reminder,
+                calculate_next_reminder(habit.time, habit.frequency),
+            )
+        self.assertEqual(
+            Habit.objects.get(pk=self.private_habit.pk).next_reminder,
+            datetime.datetime(2025, 10, 27, 5, 0, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_save_without_schedule_change(self):
+        """Сохранение без изменения расписания не трогает next_reminder."""
+        advanced = datetime.datetime(2025, 10, 26, 5, 0, tzinfo=datetime.timezone.utc)
+        Habit.objects.filter(pk=self.habit.pk).update(next_reminder=advanced)
+        habit = Habit.objects.get(pk=self.habit.pk)
+        habit.is_public = True
+
+        with CaptureQueriesContext(connection) as context:
+            habit.save()
+
+        sql = context.captured_queries[-1]["sql"]
+        self.assertIn("is_public", sql)
+        self.assertNotIn("next_reminder", sql)
+        self.assertNotIn("action", sql)
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_reminder, advanced)
+        self.assertTrue(habit.is_public)
+
+    def test_save_with_schedule_change(self):
+        """Изменение времени привычки пересчитывает next_reminder."""
+        habit = Habit.objects.get(pk=self.habit.pk)
+        habit.time = datetime.time(hour=13)
+        habit.save(update_fields=["time"])
+
+        habit.refresh_from_db()
+        self.assertEqual(
+            habit.next_reminder,
+            datetime.datetime(2025, 10, 24, 6, 0, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_save_after_refresh_from_db(self):
+        """Снимок загруженных значений обновляется при refresh_from_db."""
+        advanced = datetime.datetime(2025, 10, 30, 5, 0, tzinfo=datetime.timezone.utc)
+        habit = Habit.objects.get(pk=self.habit.pk)
+        Habit.objects.filter(pk=habit.pk).update(frequency=3, next_reminder=advanced)
+        habit.refresh_from_db()
+        habit.is_public = True
+
+        with CaptureQueriesContext(connection) as context:
+            habit.save()
+
+        sql = context.captured_queries[-1]["sql"]
+        self.assertNotIn("frequency", sql)
+        self.assertNotIn("next_reminder", sql)
+        habit.refresh_from_db()
+        self.assertEqual(habit.next_reminder, advanced)
+
+    def test_save_deferred_fields(self):
+        """Значения, присвоенные отложенным полям, сохраняются."""
+        habit = Habit.objects.only("id").get(pk=self.habit.pk)
+        habit.action = "Новое действие"
+        habit.save()
+
+        self.assertEqual(Habit.objects.get(pk=self.habit.pk).action, "Новое действие")
+
+    def test_next_reminder_read_only(self):
+        """Клиент не может задать next_reminder через API."""
+        expected = Habit.objects.get(pk=self.habit.pk).next_reminder
+        response = self.client.patch(
+            reverse_lazy("habits:habit_update", args=(self.habit.pk,)),
+            {"next_reminder": "2020-01-01T00:00:00Z"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Habit.objects.get(pk=self.habit.pk).next_reminder, expected)
+
+    def test_save_keeps_advanced_reminder(self):
+        """Сдвиг next_reminder после отправки не перезаписывается пересчетом."""
+        habit = Habit.objects.get(pk=self.habit.pk)
+        habit.next_reminder += datetime.timedelta(days=habit.frequency)
+        habit.save(update_fields=["next_reminder"])
+
+        habit.refresh_from_db()
+        self.assertEqual(
+            habit.next_reminder,
+            datetime.datetime(2025, 10, 26, 5, 0, tzinfo=datetime.timezone.utc),
+        )
+
+
+@freeze_time("2025-10-24 12:00:00+07:00")
+class DispatchTestCase(TestCase):
+
+    def setUp(self):
+        """Наполнение базы данных привычками, у которых подошло время."""
+        self.user = User.objects.create(email="aboba@example.com", tg_chat_id="42")
+        self.habit_time = datetime.datetime(
+            2025, 10, 24, 5, 0, tzinfo=datetime.timezone.utc
+        )
+        Habit.objects.bulk_create(
+            Habit(
+                owner=self.user,
+                place="Дома",
+                time=datetime.time(hour=12),
+                action=f"Действие {i}",
+                is_pleasant=False,
+                is_good=True,
+                frequency=1,
+                continuation_time=5,
+                is_public=False,
+                next_reminder=self.habit_time,
+            )
+            for i in range(25)
+        )
+
+    @override_settings(TELEGRAM_DIGEST_WINDOW=0)
+    def test_dispatch_sends_all_due_habits(self):
+        """Все привычки отправляются, next_reminder сдвигается на период."""
+        with FakeTelegramServer() as server:
+            with override_settings(TELEGRAM_API_URL=server.url):
+                summary = dispatch_due_habits(chunk_size=10, workers=4)
+
+        self.assertEqual(summary["sent"], 25)
+        self.assertEqual(summary["failed"], 0)
+        self.assertIn("rate", summary)
+        self.assertEqual(len(server.messages), 25)
+        self.assertEqual(server.messages[0]["chat_id"], "42")
+        self.assertLessEqual(server.connections, 4)
+        self.assertEqual(
+            Habit.objects.filter(
+                next_reminder=datetime.datetime(
+                    2025, 10, 25, 5, 0, tzinfo=datetime.timezone.utc
+                )
+            ).count(),
+            25,
+        )
+
+    def test_dispatch_keeps_failed_habits_due(self):
+        """При ошибке телеграма next_reminder не сдвигается."""
+        with FakeTelegramServer(status_code=500) as server:
+            with override_settings(TELEGRAM_API_URL=server.url, TELEGRAM_MAX_RETRIES=0):
+                with self.assertLogs("habits.telegram", "WARNING"):
+                    summary = dispatch_due_habits(chunk_size=10, workers=4)
+
+        self.assertEqual(summary["sent"], 0)
+        self.assertEqual(summary["failed"], 25)
+        self.assertEqual(
+            Habit.objects.filter(
+                next_reminder=datetime.datetime(
+                    2025, 10, 24, 5, 0, tzinfo=datetime.timezone.utc
+                )
+            ).count(),
+            25,
+        )
+
+    @override_settings(TELEGRAM_DIGEST_WINDOW=0)
+    def test_dispatch_keeps_rejected_habits_claimed(self):
+        """Отклоненные телеграмом привычки не отправляются повторно."""
+        with FakeTelegramServer(status_code=403) as server:
+            with override_settings(TELEGRAM_API_URL=server.url):
+                with self.assertLogs("habits.telegram", "WARNING"):
+                    summary = dispatch_due_habits(chunk_size=10, workers=4)
+
+        self.assertEqual(summary["sent"], 0)
+        self.assertEqual(summary["rejected"], 25)
+        self.assertEqual(len(server.messages), 25)
+        self.assertFalse(Habit.objects.filter(next_reminder=self.habit_time).exists())
+
+        with FakeTelegramServer(status_code=403) as server:
+            with override_settings(TELEGRAM_API_URL=server.url):
+                summary = dispatch_due_habits(chunk_size=10, workers=4)
+        self.assertEqual(summary["sent"] + summary["failed"], 0)
+        self.assertEqual(server.messages, [])
+
+    def test_dispatch_releases_claimed_habits_on_error(self):
+        """При исключении во время рассылки захват неотправленных снимается."""
+        habit_ids = claim_due_habits(self.habit_time, 25)
+        with mock.patch("habits.services.send_chunk", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                dispatch_claimed_habits(habit_ids, chunk_size=10)
+
+        self.assertEqual(
+            Habit.objects.filter(next_reminder=self.habit_time).count(), 25
+        )
+
+    @override_settings(TELEGRAM_DISPATCH_BATCH_SIZE=10, TELEGRAM_DIGEST_WINDOW=0)
+    def test_scanner_fans_out_batches(self):
+        """Сканер делит привычки на пачки и ставит их отдельными задачами."""
+        with mock.patch("habits.tasks.chord") as chord:
+            result = check_and_send_tg_notifications()
+
+        self.assertEqual(result, {"shards": 3, "habits": 25})
+        header = list(chord.call_args.args[0])
+        self.assertEqual([len(sig.args[1]) for sig in header], [10, 10, 5])
+        self.assertEqual([sig.args[0] for sig in header], [0, 1, 2])
+
+        with mock.patch("habits.tasks.chord") as chord:
+            result = check_and_send_tg_notifications()
+        self.assertEqual(result, {"shards": 0, "habits": 0})
+        chord.assert_not_called()
+
+    @override_settings(TELEGRAM_DIGEST_WINDOW=0)
+    def test_batch_task_and_summary(self):
+        """Пачка отправляется задачей, сводка собирается по шардам."""
+        ids = list(Habit.objects.order_by("pk").values_list("pk", flat=True))
+        with FakeTelegramServer() as server:
+            with override_settings(TELEGRAM_API_URL=server.url):
+                first = send_tg_notifications_batch(0, ids[:20])
+                second = send_tg_notifications_batch(1, ids[20:])
+
+        summary = collect_tg_notifications_summary([second, first])
+        self.assertEqual(summary["shards"], 2)
+        self.assertEqual(summary["sent"], 25)
+        self.assertEqual(summary["messages"], 25)
+        self.assertEqual([shard["shard"] for shard in summary["per_shard"]], [0, 1])
+        self.assertEqual(len(server.messages), 25)
+
+    def test_claim_is_exclusive(self):
+        """Захваченные привычки не попадают в повторную выборку."""
+        check_time = datetime.datetime(2025, 10, 24, 5, 1, tzinfo=datetime.timezone.utc)
+        first = claim_due_habits(check_time, limit=100)
+        second = claim_due_habits(check_time, limit=100)
+
+        self.assertEqual(len(first), 25)
+        self.assertEqual(second, [])
+
+    def test_claim_skips_missed_periods(self):
+        """Просроченная привычка сдвигается за время проверки одним захватом."""
+        Habit.objects.update(
+            next_reminder=datetime.datetime(
+                2025, 10, 20, 5, 0, tzinfo=datetime.timezone.utc
+            )
+        )
+        check_time = datetime.datetime(2025, 10, 24, 5, 1, tzinfo=datetime.timezone.utc)
+        claim_due_habits(check_time, limit=100)
+
+        self.assertEqual(
+            Habit.objects.filter(
+                next_reminder=datetime.datetime(
+                    2025, 10, 25, 5, 0, tzinfo=datetime.timezone.utc
+                )
+            ).count(),
+            25,
+        )
+
+    def test_dispatch_coalesces_reminders_per_chat(self):
+        """Напоминания одного чата, в том числе из окна сводки, объединяются."""
+        other = User.objects.create(
+            email="other@example.com", tg_chat_id="43", tg_digest_enabled=False
+        )
+        soon = datetime.datetime(2025, 10, 24, 5, 4, tzinfo=datetime.timezone.utc)
+        later = datetime.datetime(2025, 10, 24, 5, 30, tzinfo=datetime.timezone.utc)
+        Habit.objects.bulk_create(
+            Habit(
+                owner=owner,
+                time=datetime.time(hour=12),
+                action="Прогулка",
+                is_pleasant=False,
+                is_good=True,
+                frequency=1,
+                continuation_time=5,
+                is_public=False,
+                next_reminder=next_reminder,
+            )
+            for owner, next_reminder in (
+                (self.user, soon),
+                (self.user, later),
+                (other, self.habit_time),
+                (other, self.habit_time),
+            )
+        )
+
+        with FakeTelegramServer() as server:
+            with override_settings(TELEGRAM_API_URL=server.url):
+                summary = dispatch_due_habits(chunk_size=100, workers=4)
+
+        self.assertEqual(summary["sent"], 28)
+        self.assertEqual(summary["messages"], 3)
+        digest = next(m for m in server.messages if m["chat_id"] == "42")
+        self.assertTrue(digest["text"].startswith("Напоминания!"))
+        self.assertEqual(digest["text"].count("Действие:"), 26)
+        self.assertEqual(
+            sum(message["chat_id"] == "43" for message in server.messages), 2
+        )
+        self.assertTrue(Habit.objects.filter(next_reminder=later).exists())
+        self.assertFalse(Habit.objects.filter(next_reminder=soon).exists())
+
+    def test_build_digests_respects_message_limit(self):
+        """Длинная сводка делится на несколько сообщений."""
+        Habit.objects.update(action="а" * 1000)
+        digests = build_digests(Habit.objects.select_related("linked_habit"))
+
+        self.assertGreater(len(digests), 1)
+        self.assertEqual(sum(len(habits) for _, habits in digests), 25)
+        for text, _ in digests:
+            self.assertLessEqual(len(text), 4096)
+
+
+class DispatchQueriesTestCase(TestCase):
+
+    def setUp(self):
+        """Тысяча привычек, связанных с приятными привычками разных владельцев."""
+        owners = User.objects.bulk_create(
+            User(email=f"user{i}@example.com", tg_chat_id=str(i)) for i in range(10)
+        )
+        pleasant = Habit.objects.bulk_create(
+            Habit(
+                owner=owner,
+                time=datetime.time(hour=12),
+                action="Медитация",
+                is_pleasant=True,
+                is_good=False,
+                frequency=1,
+                continuation_time=60,
+                is_public=True,
+            )
+            for owner in owners
+        )
+        self.habits = Habit.objects.bulk_create(
+            Habit(
+                owner=owners[i % 10],
+                time=datetime.time(hour=12),
+                action=f"Действие {i}",
+                is_pleasant=False,
+                linked_habit=pleasant[(i + 1) % 10],
+                is_good=True,
+                frequency=1,
+                continuation_time=5,
+                is_public=False,
+                next_reminder=datetime.datetime(
+                    2025, 10, 24, 5, 0, tzinfo=datetime.timezone.utc
+                ),
+            )
+            for i in range(1000)
+        )
+        self.client = mock.Mock()
+        self.client.send_message.return_value = SENT
+
+    @override_settings(TELEGRAM_DIGEST_WINDOW=0)
+    def test_dispatch_query_count(self):
+        """Рассылка тысячи привычек читает их одним запросом."""
+        habit_ids = [habit.pk for habit in self.habits]
+        with mock.patch("habits.services.get_client", return_value=self.client):
+            with self.assertNumQueries(1):
+                summary = dispatch_claimed_habits(habit_ids, chunk_size=1000)
+
+        self.assertEqual(summary["sent"], 1000)
+        text = self.client.send_message.call_args_list[0].args[1]
+        self.assertIn("Связанная привычка: user1@example.com: Медитация", text)
+
+    def test_single_notification_query_count(self):
+        """Одиночное уведомление - один запрос чтения и один на сдвиг."""
+        with mock.patch("habits.tasks.get_client", return_value=self.client):
+            with self.assertNumQueries(2):
+                send_tg_notification(self.habits[0].pk)
+
+
+class ClaimConcurrencyTestCase(TransactionTestCase):
+
+    def setUp(self):
+        """Наполнение базы данных привычками, у которых подошло время."""
+        self.user = User.objects.create(email="aboba@example.com", tg_chat_id="42")
+        Habit.objects.bulk_create(
+            Habit(
+                owner=self.user,
+                time=datetime.time(hour=12),
+                action=f"Действие {i}",
+                is_pleasant=False,
+                is_good=True,
+                frequency=1,
+                continuation_time=5,
+                is_public=False,
+                next_reminder=datetime.datetime(
+                    2025, 10, 24, 5, 0, tzinfo=datetime.timezone.utc
+                ),
+            )
+            for i in range(500)
+        )
+
+    def test_parallel_claims_do_not_overlap(self):
+        """Параллельные воркеры делят выборку без пересечений."""
+        if connection.vendor != "postgresql":
+            self.skipTest("SKIP LOCKED проверяется только на PostgreSQL")
+
+        check_time = datetime.datetime(2025, 10, 24, 5, 1, tzinfo=datetime.timezone.utc)
+        claimed = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                while habit_ids := claim_due_habits(check_time, limit=20):
+                    with lock:
+                        claimed.extend(habit_ids)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(claimed), 500)
+        self.assertEqual(len(set(claimed)), 500)
+
+
+@freeze_time("2025-10-24 12:05:00+07:00")
+class ReminderSchedulerTestCase(TestCase):
+
+    def setUp(self):
+        """Привычки с напоминаниями внутри и за пределами горизонта."""
+        self.user = User.objects.create(email="aboba@example.com", tg_chat_id="42")
+        self.now = datetime.datetime(2025, 10, 24, 5, 0, tzinfo=datetime.timezone.utc)
+        self.soon, self.later, self.far = Habit.objects.bulk_create(
+            Habit(
+                owner=self.user,
+                time=datetime.time(hour=12),
+                action="Выпить стакан воды",
+                is_pleasant=False,
+                is_good=True,
+                frequency=1,
+                continuation_time=5,
+                is_public=False,
+                next_reminder=self.now + datetime.timedelta(minutes=minutes),
+            )
+            for minutes in (1, 30, 120)
+        )
+        self.scheduler = ReminderScheduler(horizon=3600)
+        self.scheduler.reload(self.now)
+
+    def test_reload_loads_horizon(self):
+        """В память загружаются только напоминания внутри горизонта."""
+        self.assertEqual(len(self.scheduler), 2)
+        self.assertEqual(self.scheduler.seconds_until_next(self.now), 60)
+
+    def test_pop_due_skips_rescheduled(self):
+        """Перенесенное напоминание не срабатывает по старому времени."""
+        self.scheduler.schedule(self.soon.pk, self.now + datetime.timedelta(minutes=45))
+        self.scheduler.schedule(self.later.pk, None)
+
+        self.assertEqual(
+            self.scheduler.pop_due(self.now + datetime.timedelta(minutes=40)), []
+        )
+        self.assertEqual(
+            self.scheduler.pop_due(self.now + datetime.timedelta(minutes=50)),
+            [self.soon.pk],
+        )
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_apply_message(self):
+        """Изменения из канала редиса попадают в кучу."""
+        when = self.now + datetime.timedelta(minutes=5)
+        self.scheduler.apply_message(json.dumps([[self.far.pk, when.isoformat()]]))
+
+        self.assertEqual(self.scheduler.seconds_until_next(self.now), 60)
+        self.assertEqual(self.scheduler.pop_due(when), [self.soon.pk, self.far.pk])
+
+    @override_settings(REMINDER_SCHEDULER_RETRY_DELAY=60)
+    def test_apply_message_delays_released_reminder(self):
+        """Снятое с захвата напоминание в прошлом повторяется с задержкой."""
+        now = timezone.now()
+        self.scheduler.pop_due(now)
+        released = now - datetime.timedelta(days=1)
+        self.scheduler.apply_message(json.dumps([[self.soon.pk, released.isoformat()]]))
+
+        self.assertEqual(self.scheduler.pop_due(now), [])
+        self.assertEqual(self.scheduler.seconds_until_next(now), 60)
+        self.assertEqual(
+            self.scheduler.pop_due(now + datetime.timedelta(seconds=60)),
+            [self.soon.pk],
+        )
+
+    def test_run_does_not_miss_stop(self):
+        """Остановка между расчетом таймаута и ожиданием не теряется."""
+        stop_event = threading.Event()
+        seconds_until_next = self.scheduler.seconds_until_next
+
+        def stop_before_wait(now):
+            stop_event.set()
+            self.scheduler.stop()
+            return seconds_until_next(now)
+
+        self.scheduler.pop_due(timezone.now())
+        runner = threading.Thread(
+            target=self.scheduler.run, args=(stop_event,), daemon=True
+        )
+        with mock.patch("habits.scheduler.close_old_connections"):
+            with mock.patch.object(self.scheduler, "reload"):
+                with mock.patch.object(
+                    self.scheduler, "seconds_until_next", stop_before_wait
+                ):
+                    runner.start()
+                    runner.join(timeout=5)
+
+        self.assertFalse(runner.is_alive())
+
+    def test_dispatch_claims_and_enqueues(self):
+        """Наступившие привычки захватываются и уходят в задачу отправки."""
+        with mock.patch("habits.scheduler.send_tg_notifications_batch") as task:
+            claimed = self.scheduler.dispatch([self.soon.pk, self.later.pk])
+
+        self.assertEqual(claimed, [self.soon.pk])
+        task.delay.assert_called_once_with(0, [self.soon.pk])
+        self.soon.refresh_from_db()
+        self.assertEqual(
+            self.soon.next_reminder, self.now + datetime.timedelta(days=1, minutes=1)
+        )
+
+    @override_settings(TELEGRAM_DISPATCH_BATCH_SIZE=1)
+    def test_dispatch_releases_unqueued_batches(self):
+        """Если задачу не удалось поставить, захват снимается."""
+        Habit.objects.filter(pk=self.later.pk).update(next_reminder=self.now)
+        with mock.patch("habits.scheduler.send_tg_notifications_batch") as task:
+            task.delay.side_effect = [None, ConnectionError]
+            with self.assertLogs("habits.scheduler", "ERROR"):
+                claimed = self.scheduler.dispatch([self.soon.pk, self.later.pk])
+
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(
+            Habit.objects.filter(
+                pk__in=[self.soon.pk, self.later.pk],
+                next_reminder__lte=timezone.now(),
+            ).count(),
+            1,
+        )
+
+    def test_disable_polling_task(self):
+        """Сохраненная в celery beat задача опроса отключается."""
+        interval = IntervalSchedule.objects.create(
+            every=60, period=IntervalSchedule.SECONDS
+        )
+        task = PeriodicTask.objects.create(
+            name="check_habits_to_notify_every_minute",
+            task="habits.tasks.check_and_send_tg_notifications",
+            interval=interval,
+        )
+
+        self.assertEqual(disable_polling_task(), 1)
+        task.refresh_from_db()
+        self.assertFalse(task.enabled)
+        self.assertEqual(disable_polling_task(), 0)
+
+    @override_settings(REMINDER_SCHEDULER_ENABLED=True)
+    def test_save_publishes_change(self):
+        """Сохранение и удаление привычки публикуются для планировщика."""
+        later_pk = self.later.pk
+        with mock.patch("habits.signals.publish_reminders") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.far.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.later.delete()
+
+        self.assertEqual(
+            publish.call_args_list,
+            [
+                mock.call([(self.far.pk, self.far.next_reminder)]),
+                mock.call([(later_pk, None)]),
+            ],
+        )
+
+
+class TelegramClientTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.sleep = mock.Mock()
+        self.client = TelegramClient(pool_size=2, sleep=self.sleep)
+
+    def test_keep_alive_post(self):
+        """Сообщения отправляются POST-запросами по одному соединению."""
+        with FakeTelegramServer() as server:
+            with override_settings(TELEGRAM_API_URL=server.url):
+                results = [
+                    self.client.send_message("42", f"текст {i}") for i in range(5)
+                ]
+
+        self.assertEqual(results, [SENT] * 5)
+        self.assertEqual(server.messages[0], {"chat_id": "42", "text": "текст 0"})
+        self.assertEqual(server.connections, 1)
+
+    def test_retry_after_on_429(self):
+        """Ответ 429 повторяется через retry_after из ответа телеграма."""
+        responses = [
+            (429, {"ok": False, "parameters": {"retry_after": 3}}),
+            (502, {"ok": False}),
+        ]
+        with FakeTelegramServer(responses=responses) as server:
+            with override_settings(
+                TELEGRAM_API_URL=server.url, TELEGRAM_RETRY_BACKOFF=0.5
+            ):
+                self.assertEqual(self.client.send_message("42", "текст"), SENT)
+
+        self.assertEqual(len(server.messages), 3)
+        self.assertEqual(self.sleep.call_args_list, [mock.call(3.0), mock.call(1.0)])
+
+    def test_client_error_is_not_retried(self):
+        """Ошибки запроса, кроме 429, не повторяются."""
+        with FakeTelegramServer(status_code=400) as server:
+            with override_settings(TELEGRAM_API_URL=server.url):
+                with self.assertLogs("habits.telegram", "WARNING"):
+                    self.assertEqual(self.client.send_message("42", "текст"), REJECTED)
+
+        self.assertEqual(len(server.messages), 1)
+        self.sleep.assert_not_called()
+
+    def test_token_bucket(self):
+        """Ограничитель ждет, когда запас токенов исчерпан."""
+        clock = mock.Mock(return_value=0.0)
+        sleep = mock.Mock(
+            side_effect=lambda delay: clock.configure_mock(
+                return_value=clock.return_value + delay
+            )
+        )
+        bucket = TokenBucket(rate=30, clock=clock, sleep=sleep)
+
+        for _ in range(31):
+            bucket.acquire()
+
+        self.assertEqual(sleep.call_count, 1)
+        self.assertAlmostEqual(sleep.call_args.args[0], 1 / 30)
+
+    def test_redis_token_bucket(self):
+        """Общий ограничитель ждет столько, сколько вернул скрипт редиса."""
+        sleep = mock.Mock()
+        script = mock.Mock(side_effect=["0.25", "0"])
+        with mock.patch("habits.telegram.get_redis") as get_redis:
+            get_redis.return_value.register_script.return_value = script
+            RedisTokenBucket(rate=30, key="rate", sleep=sleep).acquire()
+
+        sleep.assert_called_once_with(0.25)
+        script.assert_called_with(keys=["rate"], args=[30, 30])
+
+    def test_redis_token_bucket_fallback(self):
+        """Без редиса работает ограничитель процесса."""
+        bucket = RedisTokenBucket(rate=30, key="rate", sleep=mock.Mock())
+        bucket.fallback = mock.Mock()
+        with mock.patch("habits.telegram.get_redis") as get_redis:
+            get_redis.return_value.register_script.side_effect = redis.ConnectionError
+            with self.assertLogs("habits.telegram", "WARNING"):
+                bucket.acquire()
+                bucket.acquire()
+
+        self.assertEqual(bucket.fallback.acquire.call_count, 2)
+
+
+@override_settings(JWT_STATELESS_AUTH=True)
+class TokenUserAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="token@example.com", tg_chat_id="1")
+        self.user.set_password("password")
+        self.user.save()
+        self.habit = Habit.objects.create(
+            owner=self.user,
+            place="Дома",
+            time=datetime.time(hour=12),
+            action="Выпить стакан воды",
+            is_pleasant=False,
+            is_good=True,
+            frequency=1,
+            continuation_time=5,
+            is_public=False,
+        )
+
+    def login(self):
+        response = self.client.post(
+            reverse_lazy("users:token_obtain_pair"),
+            {"email": "token@example.com", "password": "password"},
+        )
+        return response.json()["access"]
+
+    def test_token_claims(self):
+        """Тест утверждений, добавляемых в токен доступа."""
+        token = AccessToken(self.login())
+        self.assertEqual(TokenUser(token).pk, self.user.pk)
+        self.assertEqual(token["is_superuser"], False)
+        self.assertEqual(token["is_active"], True)
+
+    def test_stateless_request_skips_user_query(self):
+        """Тест запросов к API без загрузки пользователя из базы."""
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login()}")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse_lazy("habits:habits_list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"][0]["id"], self.habit.pk)
+        self.assertFalse(
+            any("users_user" in query["sql"] for query in queries.captured_queries)
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse_lazy("habits:habit_retrieve", args=(self.habit.pk,))
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(
+            reverse_lazy("habits:habit_create"),
+            {
+                "action": "Пробежать километр",
+                "is_pleasant": False,
+                "is_good": True,
+                "frequency": 1,
+                "continuation_time": 15,
+                "is_public": False,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Habit.objects.get(pk=response.json()["id"]).owner, self.user)
+
+    def test_stateless_inactive_user(self):
+        """Тест отказа для токена неактивного пользователя."""
+        token = AccessToken.for_user(self.user)
+        token["is_superuser"] = False
+        token["is_active"] = False
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        response = self.client.get(reverse_lazy("habits:habits_list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_without_claims_falls_back_to_database(self):
+        """Тест проверки по базе для токенов без утверждений."""
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse_lazy("habits:habits_list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            any("users_user" in query["sql"] for query in queries.captured_queries)
+        )
+
+    def test_cached_full_user(self):
+        """Тест кэширования полной модели пользователя."""
+        token_user = TokenUser(AccessToken(self.login()))
+        self.assertEqual(token_user.user, self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cached_user(self.user.pk).tg_chat_id, "1")
+
+        self.user.tg_chat_id = "2"
+        self.user.save()
+        self.assertEqual(get_cached_user(self.user.pk).tg_chat_id, "2")
+
+
+class AsyncHabitViewTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="async@example.com")
+        self.other = User.objects.create(email="other@example.com")
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        self.habits = [
+            Habit.objects.create(
+                owner=self.user,
+                time=datetime.time(hour=hour),
+                action=f"Привычка {hour}",
+                is_pleasant=False,
+                is_good=True,
+                frequency=1,
+                continuation_time=5,
+                is_public=False,
+            )
+            for hour in range(7)
+        ]
+        self.other_habit = Habit.objects.create(
+            owner=self.other,
+            action="Чужая привычка",
+            is_pleasant=False,
+            is_good=True,
+            frequency=1,
+            continuation_time=5,
+            is_public=False,
+        )
+
+    def test_async_list(self):
+        """Тест асинхронного списка с курсорной пагинацией."""
+        url = reverse_lazy("habits:async_habits_list")
+        response = self.client.get(url, {"page_size": 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.json()
+        self.assertIsNotNone(first["next"])
+
+        response = self.client.get(first["next"])
+        second = response.json()
+        self.assertIsNone(second["next"])
+
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        self.assertEqual(ids, [habit.pk for habit in reversed(self.habits)])
+        self.assertEqual(
+            first["results"][0],
+            HabitRowSerializer(
+                Habit.objects.filter(pk=ids[0])
+                .values(*HabitRowSerializer.columns)
+                .get()
+            ).data,
+        )
+
+    def test_async_retrieve(self):
+        """Тест асинхронного получения привычки и скрытия чужих."""
+        habit = self.habits[0]
+        response = self.client.get(
+            reverse_lazy("habits:async_habit_detail", args=(habit.pk,))
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), HabitSerializer(habit).data)
+
+        response = self.client.get(
+            reverse_lazy("habits:async_habit_detail", args=(self.other_habit.pk,))
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_async_create_update_delete(self):
+        """Тест асинхронных создания, изменения и удаления привычки."""
+        response = self.client.post(
+            reverse_lazy("habits:async_habits_list"),
+            {
+                "action": "Пробежать километр",
+                "is_pleasant": False,
+                "is_good": True,
+                "frequency": 1,
+                "continuation_time": 15,
+                "is_public": False,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        habit = Habit.objects.get(pk=response.json()["id"])
+        self.assertEqual(habit.owner, self.user)
+
+        url = reverse_lazy("habits:async_habit_detail", args=(habit.pk,))
+        response = self.client.patch(url, {"continuation_time": 200}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", response.json())
+
+        response = self.client.patch(url, {"place": "В парке"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        habit.refresh_from_db()
+        self.assertEqual(habit.place, "В парке")
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Habit.objects.filter(pk=habit.pk).exists())
+        self.assertTrue(HabitTombstone.objects.filter(habit_id=habit.pk).exists())
+
+    def test_async_errors(self):
+        """Тест ошибок аутентификации и разбора тела запроса."""
+        url = reverse_lazy("habits:async_habits_list")
+        response = self.client.post(url, "{", content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.credentials()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class WorkerDatabaseConnectionsTestCase(SimpleTestCase):
+
+    def test_worker_conn_max_age(self):
+        """Тест срока жизни соединений с базой в воркерах celery."""
+        database = settings.DATABASES["default"]
+        self.addCleanup(database.__setitem__, "CONN_MAX_AGE", database["CONN_MAX_AGE"])
+        with override_settings(WORKER_DB_CONN_MAX_AGE=300):
+            configure_db_connections()
+        self.assertEqual(connection.settings_dict["CONN_MAX_AGE"], 300)
+
+
+class ReplicaRouterTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email="replica@example.com")
+        self.client.force_authenticate(user=self.user)
+        self.router = ReplicaRouter()
+
+    @override_settings(DATABASE_REPLICAS=["replica_0", "replica_1"])
+    def test_router(self):
+        """Тест маршрутизации чтений на реплики только в контексте чтения."""
+        self.assertIsNone(self.router.db_for_read(Habit))
+        self.assertIn(choose_replica(), ["replica_0", "replica_1"])
+        token = replica_reads.set("replica_1")
+        try:
+            self.assertEqual(self.router.db_for_read(Habit), "replica_1")
+            self.assertEqual(self.router.db_for_write(Habit), "default")
+        finally:
+            replica_reads.reset(token)
+        self.assertTrue(self.router.allow_migrate("default", "habits"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "habits"))
+
+    def spy_routing(self):
+        """
+        Список баз, выбранных роутером для чтений привычек, и патч роутера.
+        """
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            database = db_for_read(router, model, **hints)
+            if model is Habit:
+                routed.append(database)
+            return database
+
+        return routed, mock.patch.object(ReplicaRouter, "db_for_read", spy)
+
+    @override_settings(DATABASE_REPLICAS=["default"])
+    def test_one_replica_per_request(self):
+        """Тест чтения валидаторов и страницы с одной реплики."""
+        routed, spy = self.spy_routing()
+        with spy, mock.patch(
+            "config.routers.random.choice", return_value="default"
+        ) as choice:
+            response = self.client.get(reverse_lazy("habits:habits_list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(choice.call_count, 1)
+        self.assertGreater(len(routed), 1)
+        self.assertEqual(set(routed), {"default"})
+
+    @override_settings(DATABASE_REPLICAS=["default"], READ_YOUR_WRITES_WINDOW=5)
+    def test_read_your_writes(self):
+        """Тест чтения с основной базы после изменений пользователя."""
+        routed, spy = self.spy_routing()
+        with spy:
+            response = self.client.get(reverse_lazy("habits:habits_list"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(set(routed), {"default"})
+            self.assertIsNone(replica_reads.get())
+
+            response = self.client.post(
+                reverse_lazy("habits:habit_create"),
+                {
+                    "action": "Пробежать километр",
+                    "is_pleasant": False,
+                    "is_good": True,
+                    "frequency": 1,
+                    "continuation_time": 15,
+                    "is_public": False,
+                },
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertTrue(is_pinned_to_primary(self.user.pk))
+            habit_id = response.json()["id"]
+
+            routed.clear()
+            response = self.client.get(reverse_lazy("habits:habits_list"))
+            self.assertEqual(response.json()["results"][0]["id"], habit_id)
+            self.assertEqual(set(routed), {None})
+
+    @override_settings(DATABASE_REPLICAS=["default"])
+    def test_public_feed_cache_filled_from_primary(self):
+        """Тест заполнения кэша публичной ленты с основной базы."""
+        url = reverse_lazy("habits:public_habits_list")
+        routed, spy = self.spy_routing()
+        with spy:
+            self.client.get(url)
+            self.assertEqual(routed, [None])
+
+            routed.clear()
+            self.client.get(url)
+            self.assertEqual(routed, [])
+
+
+class CacheNamespaceTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.namespace = CacheNamespace("tests:namespace")
+
+    def test_get_or_set(self):
+        """Тест однократного вычисления, версий и счетчиков кэша."""
+        compute = mock.Mock(return_value={"value": 1})
+        key = self.namespace.make_key("page", 1)
+        self.assertEqual(self.namespace.get_or_set(key, compute), {"value": 1})
+        self.assertEqual(self.namespace.get_or_set(key, compute), {"value": 1})
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(
+            self.namespace.get_stats(), {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+        )
+        self.assertIsNone(cache.get(f"{key}:lock"))
+
+        self.namespace.bump()
+        self.assertNotEqual(self.namespace.make_key("page", 1), key)
+
+    def test_stampede_lock(self):
+        """Тест ожидания значения, которое вычисляет другой процесс."""
+        compute = mock.Mock(return_value={"value": 1})
+        key = self.namespace.make_key("page", 1)
+        cache.add(f"{key}:lock", True)
+
+        def other_process_done(delay):
+            cache.set(key, {"value": 2})
+
+        with mock.patch("habits.cache.time.sleep", side_effect=other_process_done):
+            self.assertEqual(self.namespace.get_or_set(key, compute), {"value": 2})
+        compute.assert_not_called()
+
+    @override_settings(CACHE_LOCK_TIMEOUT=0)
+    def test_stampede_lock_timeout(self):
+        """Тест вычисления значения, если блокировка не освободилась вовремя."""
+        compute = mock.Mock(return_value={"value": 1})
+        key = self.namespace.make_key("page", 1)
+        cache.add(f"{key}:lock", True)
+        self.assertEqual(self.namespace.get_or_set(key, compute), {"value": 1})
+        self.assertTrue(cache.get(f"{key}:lock"))
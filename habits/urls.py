@@ -1,9 +1,12 @@
 from django.urls import path
 
 from habits.apps import HabitsConfig
-from habits.views import (HabitCreateAPIView, HabitDestroyAPIView,
+from habits.async_views import AsyncHabitDetailView, AsyncHabitListCreateView
+from habits.views import (HabitBulkAPIView, HabitCreateAPIView,
+                          HabitDestroyAPIView, HabitExportAPIView,
                           HabitListAPIView, HabitRetrieveAPIView,
-                          HabitUpdateAPIView, PublicHabitListAPIView)
+                          HabitSyncAPIView, HabitUpdateAPIView,
+                          PublicHabitListAPIView)
 
 app_name = HabitsConfig.name
 
@@ -11,8 +14,13 @@ app_name = HabitsConfig.name
 urlpatterns = [
     path("", HabitListAPIView.as_view(), name="habits_list"),
     path("public/", PublicHabitListAPIView.as_view(), name="public_habits_list"),
+    path("bulk/", HabitBulkAPIView.as_view(), name="habits_bulk"),
+    path("export/", HabitExportAPIView.as_view(), name="habits_export"),
+    path("sync/", HabitSyncAPIView.as_view(), name="habits_sync"),
     path("create/", HabitCreateAPIView.as_view(), name="habit_create"),
     path("<int:pk>/", HabitRetrieveAPIView.as_view(), name="habit_retrieve"),
     path("<int:pk>/update/", HabitUpdateAPIView.as_view(), name="habit_update"),
     path("<int:pk>/delete/", HabitDestroyAPIView.as_view(), name="habit_delete"),
+    path("async/", AsyncHabitListCreateView.as_view(), name="async_habits_list"),
+    path("async/<int:pk>/", AsyncHabitDetailView.as_view(), name="async_habit_detail"),
 ]
@@ -1,13 +1,26 @@
-from rest_framework import generics
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
-
+from rest_framework.response import Response
+
+from habits.bulk import (bulk_create_habits, bulk_delete_habits,
+                         bulk_update_habits)
+from habits.export import EXPORT_TYPES, iter_export
+from habits.mixins import (ConditionalListMixin, ConditionalRetrieveMixin,
+                           OwnerQuerySetMixin, PublicFeedCacheMixin,
+                           ReadYourWritesMixin, ReplicaReadMixin, RowListMixin,
+                           SparseFieldsMixin, SparseObjectMixin)
 from habits.models import Habit
 from habits.paginators import HabitPaginator
 from habits.permissions import IsOwner
-from habits.serializers import HabitSerializer
+from habits.serializers import HabitRowSerializer, HabitSerializer
+from habits.sync import create_tombstones, get_changes, touch_dependents
+from users.models import User
 
 
-class HabitCreateAPIView(generics.CreateAPIView):
+class HabitCreateAPIView(ReadYourWritesMixin, generics.CreateAPIView):
     """
     Представление создания привычки.
     """
@@ -16,31 +29,38 @@ class HabitCreateAPIView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         """Присваивание создателя привычке."""
-        serializer.save(owner=self.request.user)
+        serializer.save(owner=User(pk=self.request.user.pk))
 
 
-class HabitListAPIView(generics.ListAPIView):
+class HabitListAPIView(
+    ReplicaReadMixin,
+    OwnerQuerySetMixin,
+    ConditionalListMixin,
+    RowListMixin,
+    generics.ListAPIView,
+):
     """
     Представление списка привычек пользователя.
     """
 
     serializer_class = HabitSerializer
+    row_serializer_class = HabitRowSerializer
+    queryset = Habit.objects.all()
     pagination_class = HabitPaginator
 
-    def get_queryset(self):
-        """Фильтрация привычек по владельцу."""
-        queryset = Habit.objects.all()
-        if not self.request.user.is_superuser:
-            queryset = queryset.filter(owner=self.request.user)
-        return queryset
 
-
-class PublicHabitListAPIView(generics.ListAPIView):
+class PublicHabitListAPIView(
+    ReplicaReadMixin,
+    PublicFeedCacheMixin,
+    RowListMixin,
+    generics.ListAPIView,
+):
     """
     Представление списка привычек пользователя.
     """
 
     serializer_class = HabitSerializer
+    row_serializer_class = HabitRowSerializer
     pagination_class = HabitPaginator
 
     def get_queryset(self):
@@ -51,7 +71,13 @@ class PublicHabitListAPIView(generics.ListAPIView):
         return queryset
 
 
-class HabitRetrieveAPIView(generics.RetrieveAPIView):
+class HabitRetrieveAPIView(
+    ReplicaReadMixin,
+    OwnerQuerySetMixin,
+    SparseObjectMixin,
+    ConditionalRetrieveMixin,
+    generics.RetrieveAPIView,
+):
     """
     Представление получения привычки.
     """
@@ -59,19 +85,24 @@ class HabitRetrieveAPIView(generics.RetrieveAPIView):
     serializer_class = HabitSerializer
     queryset = Habit.objects.all()
     permission_classes = [IsAuthenticated, IsOwner]
+    loaded_fields = ("id", "owner", "updated_at")
 
 
-class HabitUpdateAPIView(generics.UpdateAPIView):
+class HabitUpdateAPIView(
+    ReadYourWritesMixin, OwnerQuerySetMixin, generics.UpdateAPIView
+):
     """
     Представление обновления урока.
     """
 
     serializer_class = HabitSerializer
-    queryset = Habit.objects.all()
+    queryset = Habit.objects.select_related("linked_habit")
     permission_classes = [IsAuthenticated, IsOwner]
 
 
-class HabitDestroyAPIView(generics.DestroyAPIView):
+class HabitDestroyAPIView(
+    ReadYourWritesMixin, OwnerQuerySetMixin, generics.DestroyAPIView
+):
     """
     Представление обновления урока.
     """
@@ -79,3 +110,117 @@ class HabitDestroyAPIView(generics.DestroyAPIView):
     serializer_class = HabitSerializer
     queryset = Habit.objects.all()
     permission_classes = [IsAuthenticated, IsOwner]
+
+    def perform_destroy(self, instance):
+        """Удаление с отметкой для синхронизации клиентов."""
+        with transaction.atomic():
+            touch_dependents([instance])
+            create_tombstones([instance])
+            instance.delete()
+
+
+class HabitBulkAPIView(ReadYourWritesMixin, generics.GenericAPIView):
+    """
+    Представление пакетного создания, обновления и удаления привычек.
+    """
+
+    serializer_class = HabitSerializer
+    max_items = 1000
+
+    def get_items(self):
+        """Список элементов пакета из тела запроса."""
+        items = self.request.data
+        if not isinstance(items, list):
+            raise ValidationError("Ожидается список.")
+        if len(items) > self.max_items:
+            raise ValidationError(f"Не больше {self.max_items} элементов за запрос.")
+        return items
+
+    def post(self, request, *args, **kwargs):
+        """Создание пакета привычек."""
+        habits = bulk_create_habits(
+            request.user.pk, self.get_items(), self.get_serializer_context()
+        )
+        return Response(
+            self.get_serializer(habits, many=True).data, status=status.HTTP_201_CREATED
+        )
+
+    def patch(self, request, *args, **kwargs):
+        """Частичное обновление пакета привычек по полю id."""
+        habits = bulk_update_habits(
+            request.user.pk, self.get_items(), self.get_serializer_context()
+        )
+        return Response(self.get_serializer(habits, many=True).data)
+
+    def delete(self, request, *args, **kwargs):
+        """Удаление пакета привычек по списку id."""
+        bulk_delete_habits(request.user.pk, self.get_items())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class HabitSyncAPIView(generics.GenericAPIView):
+    """
+    Представление дельта-синхронизации привычек пользователя.
+    """
+
+    serializer_class = HabitSerializer
+    page_size = 100
+    max_page_size = 1000
+
+    def get(self, request, *args, **kwargs):
+        """Изменения и удаления после токена since."""
+        try:
+            limit = int(request.query_params.get("limit", self.page_size))
+        except ValueError:
+            raise ValidationError({"limit": "Ожидается целое число."})
+        limit = min(max(limit, 1), self.max_page_size)
+
+        changes = get_changes(request.user.pk, request.query_params.get("since"), limit)
+        changes["habits"] = self.get_serializer(changes["habits"], many=True).data
+        return Response(changes)
+
+
+class HabitExportAPIView(
+    OwnerQuerySetMixin, SparseFieldsMixin, generics.GenericAPIView
+):
+    """
+    Представление потоковой выгрузки привычек в NDJSON или CSV.
+
+    Строки читаются курсором на стороне сервера пачками по chunk_size
+    и сразу отдаются клиенту, поэтому память не зависит от числа привычек.
+    Формат выбирается параметром type, так как format занят DRF.
+    """
+
+    queryset = Habit.objects.all()
+    row_serializer_class = HabitRowSerializer
+    chunk_size = 2000
+
+    def perform_content_negotiation(self, request, force=False):
+        """Выгрузка не зависит от Accept, ошибки отдаются в JSON."""
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, *args, **kwargs):
+        """Выгрузка привычек пользователя, а для суперюзера - всех."""
+        export_type = request.query_params.get("type", "ndjson")
+        if export_type not in EXPORT_TYPES:
+            raise ValidationError(
+                {"type": f"Допустимые значения: {', '.join(EXPORT_TYPES)}."}
+            )
+
+        serializer_class = self.row_serializer_class
+        fields = self.get_requested_fields(serializer_class.field_names)
+        rows = (
+            self.get_queryset()
+            .order_by("pk")
+            .values(*serializer_class.get_columns(fields))
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+        response = StreamingHttpResponse(
+            iter_export(rows, serializer_class(None, fields=fields), export_type),
+            content_type=EXPORT_TYPES[export_type][1],
+        )
+        response.headers["Content-Disposition"] = (
+            f'attachment; filename="habits.{export_type}"'
+        )
+        return response
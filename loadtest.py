@@ -0,0 +1,223 @@
+"""
+Нагрузочный сценарий для эндпоинтов habits/.
+
+Против запущенного сервера:
+    python loadtest.py --base-url http://localhost --email ... --password ...
+
+С локальным запуском gunicorn на разном числе воркеров, чтобы увидеть,
+как пропускная способность растет с числом ядер:
+    python loadtest.py --spawn-workers 1 2 4 8 --email ... --password ...
+
+Сравнение синхронного и асинхронного стека при большом числе соединений:
+    python loadtest.py --spawn-workers 2 --concurrency 256 --paths /habits/ ...
+    python loadtest.py --spawn-workers 2 --concurrency 256 --paths /habits/async/ \
+        --app config.asgi --worker-class uvicorn_worker.UvicornWorker \
+        --conn-max-age 0 ...
+
+Задержки с новым соединением на каждый запрос и с переиспользованием:
+    python loadtest.py --spawn-workers 2 --conn-max-age 0 60 ...
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+DEFAULT_PATHS = ["/habits/", "/habits/public/", "/habits/?fields=id,time"]
+
+
+def get_token(base_url, email, password):
+    """
+    Токен доступа для запросов сценария.
+    """
+    response = requests.post(
+        f"{base_url}/users/login/",
+        json={"email": email, "password": password},
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.json()["access"]
+
+
+def worker(base_url, paths, token, deadline, results, lock):
+    """
+    Поток, без пауз запрашивающий пути по кругу до deadline.
+    """
+    session = requests.Session()
+    session.headers["Authorization"] = f"Bearer {token}"
+    latencies = []
+    errors = 0
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = session.get(f"{base_url}{paths[i % len(paths)]}", timeout=30)
+            if not response.ok:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+        i += 1
+    with lock:
+        results["latencies"] += latencies
+        results["errors"] += errors
+
+
+def run_load(base_url, paths, token, concurrency, duration):
+    """
+    Нагрузка из concurrency потоков в течение duration секунд.
+    """
+    results = {"latencies": [], "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=worker, args=(base_url, paths, token, deadline, results, lock)
+        )
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(results["latencies"])
+    if not latencies:
+        return {"requests": 0, "errors": results["errors"], "rps": 0}
+
+    def percentile(q):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000
+
+    return {
+        "requests": len(latencies),
+        "errors": results["errors"],
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+    }
+
+
+def format_result(label, result):
+    """
+    Строка отчета по одному прогону.
+    """
+    line = (
+        f"{label}: {result['requests']} запросов, ошибок {result['errors']}, "
+        f"{result['rps']:.0f} rps"
+    )
+    if result["requests"]:
+        line += (
+            f", p50={result['p50']:.1f} мс, p95={result['p95']:.1f} мс, "
+            f"p99={result['p99']:.1f} мс"
+        )
+    return line
+
+
+def wait_for_server(base_url, server, timeout=30):
+    """
+    Ожидание, пока запущенный сервер начнет отвечать.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn завершился с кодом {server.returncode}")
+        try:
+            requests.get(f"{base_url}/habits/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Сервер {base_url} не запустился за {timeout} с")
+
+
+def spawn_gunicorn(workers, threads, bind, app, worker_class, conn_max_age=None):
+    """
+    Запуск gunicorn с заданным числом и классом воркеров.
+
+    conn_max_age переопределяет DB_CONN_MAX_AGE сервера; под config.asgi
+    по умолчанию 0, так как постоянные соединения там не переиспользуются.
+    """
+    if conn_max_age is None and app == "config.asgi":
+        conn_max_age = 0
+    env = {
+        **os.environ,
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_THREADS": str(threads),
+        "GUNICORN_WORKER_CLASS": worker_class,
+        "GUNICORN_BIND": bind,
+        "GUNICORN_ACCESS_LOG": "",
+    }
+    if conn_max_age is not None:
+        env["DB_CONN_MAX_AGE"] = str(conn_max_age)
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "config/gunicorn.conf.py", app],
+        env=env,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument(
+        "--spawn-workers",
+        type=int,
+        nargs="+",
+        help="Запускать gunicorn локально с указанным числом воркеров",
+    )
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--app", default="config.wsgi")
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument(
+        "--conn-max-age",
+        type=int,
+        nargs="+",
+        default=[None],
+        help="Прогонять каждый запуск с указанными DB_CONN_MAX_AGE",
+    )
+    args = parser.parse_args()
+
+    if not args.spawn_workers:
+        token = get_token(args.base_url, args.email, args.password)
+        result = run_load(
+            args.base_url, args.paths, token, args.concurrency, args.duration
+        )
+        print(format_result(args.base_url, result))
+        return
+
+    bind = args.base_url.split("://", 1)[-1]
+    for workers, conn_max_age in itertools.product(
+        args.spawn_workers, args.conn_max_age
+    ):
+        server = spawn_gunicorn(
+            workers, args.threads, bind, args.app, args.worker_class, conn_max_age
+        )
+        try:
+            wait_for_server(args.base_url, server)
+            token = get_token(args.base_url, args.email, args.password)
+            result = run_load(
+                args.base_url, args.paths, token, args.concurrency, args.duration
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        label = f"{args.worker_class}: {workers} воркеров x {args.threads} потоков"
+        if conn_max_age is not None:
+            label += f", CONN_MAX_AGE={conn_max_age}"
+        print(format_result(label, result))
+
+
+if __name__ == "__main__":
+    main()
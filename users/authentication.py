@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt import models
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (AuthenticationFailed,
+                                                 InvalidToken)
+from rest_framework_simplejwt.settings import api_settings
+
+from users.models import User
+
+TOKEN_CLAIMS = ("is_superuser", "is_active")
+
+
+def get_user_cache_key(user_id):
+    return f"users:user:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    Пользователь из базы с кэшированием на TOKEN_USER_CACHE_TIMEOUT секунд.
+    """
+    key = get_user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.get(pk=user_id)
+        cache.set(key, user, timeout=settings.TOKEN_USER_CACHE_TIMEOUT)
+    return user
+
+
+class TokenUser(models.TokenUser):
+    """
+    Пользователь, восстановленный из утверждений токена без запроса к базе.
+
+    Полная модель доступна через user и загружается по требованию.
+    """
+
+    @cached_property
+    def id(self):
+        # simplejwt хранит идентификатор строкой, а owner_id в базе - число.
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def is_active(self):
+        return self.token.get("is_active", True)
+
+    @cached_property
+    def user(self):
+        return get_cached_user(self.pk)
+
+
+class UserJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация с режимом без загрузки пользователя.
+
+    При JWT_STATELESS_AUTH=True пользователь строится из утверждений токена
+    (id, is_superuser, is_active), что экономит запрос на каждый вызов API.
+    Токены, выданные без этих утверждений, проверяются по базе, как раньше.
+    """
+
+    def get_user(self, validated_token):
+        if not settings.JWT_STATELESS_AUTH or not all(
+            claim in validated_token for claim in TOKEN_CLAIMS
+        ):
+            return super().get_user(validated_token)
+
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Токен не содержит идентификатора пользователя")
+        user = TokenUser(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed("Пользователь неактивен", code="user_inactive")
+        return user
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_alter_user_tg_chat_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="tg_digest_enabled",
+            field=models.BooleanField(
+                default=True,
+                help_text="Присылать несколько напоминаний одним сообщением",
+                verbose_name="объединять напоминания",
+            ),
+        ),
+    ]
@@ -17,6 +17,11 @@ class User(AbstractUser):
         help_text="Введите ваш телеграм chat_id",
         max_length=255,
     )
+    tg_digest_enabled = models.BooleanField(
+        verbose_name="объединять напоминания",
+        help_text="Присылать несколько напоминаний одним сообщением",
+        default=True,
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["tg_chat_id"]
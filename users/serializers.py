@@ -1,4 +1,5 @@
 from rest_framework.serializers import ModelSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from users.models import User
 
@@ -9,3 +10,14 @@ class UserSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = "__all__"
+
+
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Выдача токенов с утверждениями для аутентификации без базы"""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["is_superuser"] = user.is_superuser
+        token["is_active"] = user.is_active
+        return token